@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Benchmark model_usage.py on synthetic codexbar cost payloads.
+
+Each case runs in its own child process so peak RSS is attributable to it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from typing import IO, Any, Callable, Dict, List, Optional, Tuple
+
+import model_usage
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_usage.py")
+SUFFIXES = {"k": 1_000, "m": 1_000_000}
+MODEL_FAMILIES = ["gpt-5", "gpt-5-codex", "o3", "o4-mini", "claude-opus-4", "claude-sonnet-4"]
+MODEL_VARIANTS = ["", "-2025-06-01", "-2025-08-15", "-preview", "-high", "-mini"]
+
+
+def row_count(value: str) -> int:
+    text = value.strip().lower()
+    scale = SUFFIXES.get(text[-1:], 1)
+    digits = text[:-1] if text[-1:] in SUFFIXES else text
+    try:
+        parsed = int(float(digits) * scale)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(f"invalid row count: {value}") from exc
+    if parsed < 1:
+        raise argparse.ArgumentTypeError("row count must be >= 1")
+    return parsed
+
+
+def synthetic_models() -> List[str]:
+    return [family + variant for family in MODEL_FAMILIES for variant in MODEL_VARIANTS]
+
+
+def write_synthetic_payload(
+    handle: IO[str], rows: int, seed: int = 0, span_days: int = 3 * 365
+) -> int:
+    """Write a codexbar cost payload with `rows` modelBreakdowns rows; returns daily row count.
+
+    Models follow a Zipf-like popularity curve over 36 names. Dates cycle over
+    `span_days` ending today, so large payloads repeat dates like merged fleet exports.
+    """
+    rng = random.Random(seed)
+    models = synthetic_models()
+    weights = [1.0 / (rank + 1) for rank in range(len(models))]
+    today = date.today()
+    handle.write('[{"provider": "codex", "source": "synthetic", "daily": [')
+    written = 0
+    entries = 0
+    while written < rows:
+        per_day = min(rows - written, rng.randint(1, 6))
+        picked = rng.choices(models, weights=weights, k=per_day)
+        entry = {
+            "date": (today - timedelta(days=entries % span_days)).isoformat(),
+            "totalCost": 0.0,
+            "modelsUsed": sorted(set(picked)),
+            "modelBreakdowns": [
+                {"modelName": model, "cost": round(rng.random() * 20, 4)} for model in picked
+            ],
+        }
+        handle.write(("," if entries else "") + json.dumps(entry))
+        written += per_day
+        entries += 1
+    handle.write("]}]")
+    return entries
+
+
+def loaded_entries(path: str, days: Optional[int] = None) -> List[Dict[str, Any]]:
+    payload = model_usage.load_payload(path, "codex")
+    return model_usage.filter_by_days(model_usage.parse_daily_entries(payload), days)
+
+
+def time_call(func: Callable[[], Any]) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def run_case(case: str, path: str) -> float:
+    """Time one case in this process; setup (loading rows) is excluded."""
+    if case == "load_payload":
+        return time_call(lambda: model_usage.load_payload(path, "codex"))
+    if case == "stream":
+        return time_call(
+            lambda: model_usage.aggregate_costs(model_usage.stream_daily_entries(path, "codex"))
+        )
+    entries = loaded_entries(path)
+    if case == "filter_by_days":
+        return time_call(lambda: model_usage.filter_by_days(entries, 30))
+    if case == "aggregate_costs":
+        return time_call(lambda: model_usage.aggregate_costs(entries))
+    if case == "pick_current_model":
+        return time_call(lambda: model_usage.pick_current_model(entries))
+    if case == "summarize_entries":
+        return time_call(lambda: model_usage.summarize_entries(entries))
+    raise ValueError(f"unknown case: {case}")
+
+
+CASES = [
+    "load_payload",
+    "stream",
+    "filter_by_days",
+    "aggregate_costs",
+    "pick_current_model",
+    "summarize_entries",
+]
+CLI_CASES = {
+    "cli_current": ["--mode", "current"],
+    "cli_all": ["--mode", "all"],
+    "cli_all_stream": ["--mode", "all", "--stream"],
+}
+
+
+def max_rss_bytes(rusage: Any) -> int:
+    # ru_maxrss is bytes on macOS and KiB on Linux.
+    return rusage.ru_maxrss if sys.platform == "darwin" else rusage.ru_maxrss * 1024
+
+
+def run_measured(cmd: List[str]) -> Tuple[float, int, str]:
+    """Run cmd; return (wall seconds, the child's own peak RSS in bytes, stdout)."""
+    with tempfile.TemporaryFile() as errors:
+        start = time.perf_counter()
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=errors)
+        assert proc.stdout is not None
+        stdout = proc.stdout.read()
+        proc.stdout.close()
+        # wait4 reports rusage for this child alone, unlike RUSAGE_CHILDREN.
+        _, status, rusage = os.wait4(proc.pid, 0)
+        elapsed = time.perf_counter() - start
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        if proc.returncode != 0:
+            errors.seek(0)
+            message = errors.read().decode("utf-8", errors="replace").strip()
+            raise RuntimeError(f"{' '.join(cmd)} failed ({proc.returncode}): {message}")
+    return elapsed, max_rss_bytes(rusage), stdout.decode("utf-8")
+
+
+def bench(path: str, repeat: int) -> List[Dict[str, Any]]:
+    results: List[Dict[str, Any]] = []
+    for case in CASES:
+        best: Optional[Tuple[float, int]] = None
+        for _ in range(repeat):
+            _, rss, out = run_measured([sys.executable, __file__, "--case", case, "--input", path])
+            seconds = float(out.strip())
+            best = (seconds, rss) if best is None or seconds < best[0] else best
+        assert best is not None
+        results.append({"case": case, "seconds": best[0], "peakRSSBytes": best[1]})
+    for case, flags in CLI_CASES.items():
+        best = None
+        for _ in range(repeat):
+            seconds, rss, _ = run_measured(
+                [sys.executable, SCRIPT, "--input", path, "--format", "json", *flags]
+            )
+            best = (seconds, rss) if best is None or seconds < best[0] else best
+        assert best is not None
+        results.append({"case": case, "seconds": best[0], "peakRSSBytes": best[1]})
+    return results
+
+
+def render_text(rows: int, results: List[Dict[str, Any]]) -> str:
+    lines = [f"Rows: {rows:,}"]
+    for result in results:
+        lines.append(
+            f"- {result['case']:<20} {result['seconds'] * 1000:>10.1f} ms"
+            f" {result['peakRSSBytes'] / (1 << 20):>9.1f} MiB"
+        )
+    return "\n".join(lines)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark model_usage.py on synthetic payloads.")
+    parser.add_argument(
+        "--rows",
+        default="1k,100k",
+        help="Comma-separated breakdown row counts, e.g. 1k,100k,10M (default: 1k,100k).",
+    )
+    parser.add_argument("--repeat", type=model_usage.positive_int, default=3, help="Best of N runs.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--format", choices=["text", "json"], default="text")
+    parser.add_argument(
+        "--keep", metavar="DIR", help="Write payloads to DIR and keep them instead of a temp dir."
+    )
+    parser.add_argument("--case", choices=CASES, help=argparse.SUPPRESS)
+    parser.add_argument("--input", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(run_case(args.case, args.input))
+        return 0
+
+    try:
+        sizes = [row_count(value) for value in args.rows.split(",") if value.strip()]
+    except argparse.ArgumentTypeError as exc:
+        parser.error(str(exc))
+
+    report: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        directory = args.keep or tmpdir
+        os.makedirs(directory, exist_ok=True)
+        for rows in sizes:
+            path = os.path.join(directory, f"codexbar-cost-{rows}.json")
+            with open(path, "w", encoding="utf-8") as handle:
+                write_synthetic_payload(handle, rows, seed=args.seed)
+            results = bench(path, args.repeat)
+            report.append({"rows": rows, "results": results})
+            if args.format == "text":
+                print(render_text(rows, results), flush=True)
+
+    if args.format == "json":
+        print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
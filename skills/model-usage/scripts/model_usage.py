@@ -8,13 +8,53 @@ Defaults to current model (most recent daily entry), or list all models.
 from __future__ import annotations
 
 import argparse
+import glob
+import hashlib
 import json
 import os
 import subprocess
 import sys
-from dataclasses import dataclass
+import threading
+import time
+from array import array
+from dataclasses import dataclass, field
 from datetime import date, datetime, timedelta
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from functools import reduce
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+from urllib.parse import parse_qs
+
+if TYPE_CHECKING:
+    # sqlite3, the executors and http.server are imported by the functions that use
+    # them, keeping a plain run's startup lean.
+    import sqlite3
+
+STREAM_CHUNK_SIZE = 1 << 16
+# Characters that may follow a number's decoded prefix when a read cut it short;
+# "" stands for the end of the buffer.
+NUMBER_CONTINUATION = ("", *"0123456789.eE+-")
+DEFAULT_CACHE_TTL = 300
+PROVIDERS = ("codex", "claude")
+BUCKETS = ("day", "week", "month")
+DEFAULT_SERVE_PORT = 8765
+
+# {date: (modelsUsed, {model: cost}, raw row count)}; see rollup_entries.
+Rollup = Dict[str, Tuple[List[str], Dict[str, Optional[float]], int]]
+# Rollup key for rows without a valid date.
+UNDATED = ""
+# Entries rebuilt from a rollup record how many raw rows they stand for under this
+# key; the underscore keeps it apart from codexbar's own entry fields.
+_ROW_COUNT_KEY = "_rowCount"
 
 
 def positive_int(value: str) -> int:
@@ -27,6 +67,16 @@ def positive_int(value: str) -> int:
     return parsed
 
 
+def non_negative_int(value: str) -> int:
+    try:
+        parsed = int(value)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError("must be an integer") from exc
+    if parsed < 0:
+        raise argparse.ArgumentTypeError("must be >= 0")
+    return parsed
+
+
 def eprint(msg: str) -> None:
     print(msg, file=sys.stderr)
 
@@ -48,19 +98,29 @@ def run_codexbar_cost(provider: str) -> List[Dict[str, Any]]:
     return payload
 
 
+def read_json_input(input_path: str) -> Any:
+    if input_path == "-":
+        raw = sys.stdin.read()
+    else:
+        with open(input_path, "r", encoding="utf-8") as handle:
+            raw = handle.read()
+    return json.loads(raw)
+
+
 def load_payload(input_path: Optional[str], provider: str) -> Dict[str, Any]:
     if input_path:
-        if input_path == "-":
-            raw = sys.stdin.read()
-        else:
-            with open(input_path, "r", encoding="utf-8") as handle:
-                raw = handle.read()
-        data = json.loads(raw)
+        data = read_json_input(input_path)
     else:
         data = run_codexbar_cost(provider)
+    return select_provider_payload(data, provider)
 
+
+def select_provider_payload(data: Any, provider: str) -> Dict[str, Any]:
+    # A bare object belongs to its "provider", or to any provider when it has none.
     if isinstance(data, dict):
-        return data
+        if data.get("provider", provider) == provider:
+            return data
+        raise RuntimeError(f"Provider '{provider}' not found in codexbar payload.")
 
     if isinstance(data, list):
         for entry in data:
@@ -71,6 +131,174 @@ def load_payload(input_path: Optional[str], provider: str) -> Dict[str, Any]:
     raise RuntimeError("Unsupported JSON input format.")
 
 
+class JsonStream:
+    """Incremental reader that decodes one JSON value at a time from a text handle."""
+
+    def __init__(self, handle: IO[str], chunk_size: int = STREAM_CHUNK_SIZE) -> None:
+        self.handle = handle
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self, size: Optional[int] = None) -> bool:
+        if self.eof:
+            return False
+        chunk = self.handle.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise RuntimeError(
+                f"Malformed JSON input: expected '{char}', found '{found or 'EOF'}'."
+            )
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as exc:
+                # Incomplete value at the end of the buffer; grow it geometrically so
+                # large values are re-decoded O(log n) times rather than once per chunk.
+                if not self._fill(max(self.chunk_size, len(self.buf) - self.pos)):
+                    raise RuntimeError(f"Malformed JSON input: {exc}") from exc
+                continue
+            # A number cut by the buffer boundary decodes as a shorter prefix ("12" of
+            # "12.34", "1" of "1e5"); read on while it could still continue.
+            if (
+                isinstance(value, (int, float))
+                and not isinstance(value, bool)
+                and self.buf[end : end + 1] in NUMBER_CONTINUATION
+                and self._fill()
+            ):
+                continue
+            self.pos = end
+            return value
+
+    def iter_array(self) -> Iterator[None]:
+        """Position the stream at each array element in turn; the caller consumes it."""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield None
+            sep = self.peek()
+            self.pos += 1
+            if sep == "]":
+                return
+            if sep != ",":
+                raise RuntimeError(f"Malformed JSON input: unexpected '{sep or 'EOF'}' in array.")
+
+    def iter_object_keys(self) -> Iterator[str]:
+        """Yield each object key with the stream positioned at its value."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise RuntimeError("Malformed JSON input: object key is not a string.")
+            self.expect(":")
+            yield key
+            sep = self.peek()
+            self.pos += 1
+            if sep == "}":
+                return
+            if sep != ",":
+                raise RuntimeError(f"Malformed JSON input: unexpected '{sep or 'EOF'}' in object.")
+
+
+def _stream_provider_daily(
+    stream: JsonStream, provider: Optional[str], bare: bool = False
+) -> Generator[Dict[str, Any], None, bool]:
+    """Yield daily entries of the provider object at the stream position.
+
+    Returns True when the object matched `provider` (always for provider=None);
+    with `bare`, an object without a "provider" key matches too. Entries seen
+    before the `provider` key are buffered until it is known.
+    """
+    matched: Optional[bool] = None if provider else True
+    pending: List[Dict[str, Any]] = []
+    for key in stream.iter_object_keys():
+        if key == "provider":
+            value = stream.value()
+            if matched is None:
+                matched = value == provider
+                if matched:
+                    yield from pending
+                pending = []
+        elif key == "daily" and stream.peek() == "[":
+            for _ in stream.iter_array():
+                entry = stream.value()
+                if not isinstance(entry, dict) or matched is False:
+                    continue
+                if matched:
+                    yield entry
+                else:
+                    pending.append(entry)
+        else:
+            stream.value()
+    if matched is None and bare:
+        yield from pending
+        return True
+    return bool(matched)
+
+
+def iter_stream_daily_entries(
+    handle: IO[str], provider: str, chunk_size: int = STREAM_CHUNK_SIZE
+) -> Iterator[Dict[str, Any]]:
+    """Stream daily entries without materializing the whole payload.
+
+    Mirrors load_payload + parse_daily_entries: a top-level object is used when
+    its provider matches or is missing, a top-level array yields the first
+    object whose provider matches.
+    """
+    stream = JsonStream(handle, chunk_size)
+    first = stream.peek()
+    if first == "{":
+        if not (yield from _stream_provider_daily(stream, provider, bare=True)):
+            raise RuntimeError(f"Provider '{provider}' not found in codexbar payload.")
+        return
+    if first == "[":
+        for _ in stream.iter_array():
+            if stream.peek() != "{":
+                stream.value()
+                continue
+            matched = yield from _stream_provider_daily(stream, provider)
+            if matched:
+                return
+        raise RuntimeError(f"Provider '{provider}' not found in codexbar payload.")
+    raise RuntimeError("Unsupported JSON input format.")
+
+
+def stream_daily_entries(input_path: str, provider: str) -> Iterator[Dict[str, Any]]:
+    if input_path == "-":
+        yield from iter_stream_daily_entries(sys.stdin, provider)
+        return
+    with open(input_path, "r", encoding="utf-8") as handle:
+        yield from iter_stream_daily_entries(handle, provider)
+
+
 @dataclass
 class ModelCost:
     model: str
@@ -93,19 +321,30 @@ def parse_date(value: str) -> Optional[date]:
         return None
 
 
-def filter_by_days(entries: List[Dict[str, Any]], days: Optional[int]) -> List[Dict[str, Any]]:
+def days_cutoff(days: int) -> date:
+    return date.today() - timedelta(days=days - 1)
+
+
+def iter_filter_by_days(
+    entries: Iterable[Dict[str, Any]], days: Optional[int]
+) -> Iterator[Dict[str, Any]]:
     if not days:
-        return entries
-    cutoff = date.today() - timedelta(days=days - 1)
-    filtered: List[Dict[str, Any]] = []
+        yield from entries
+        return
+    cutoff = days_cutoff(days)
     for entry in entries:
         day = entry.get("date")
         if not isinstance(day, str):
             continue
         parsed = parse_date(day)
         if parsed and parsed >= cutoff:
-            filtered.append(entry)
-    return filtered
+            yield entry
+
+
+def filter_by_days(entries: List[Dict[str, Any]], days: Optional[int]) -> List[Dict[str, Any]]:
+    if not days:
+        return entries
+    return list(iter_filter_by_days(entries, days))
 
 
 def aggregate_costs(entries: Iterable[Dict[str, Any]]) -> Dict[str, float]:
@@ -129,60 +368,449 @@ def aggregate_costs(entries: Iterable[Dict[str, Any]]) -> Dict[str, float]:
     return totals
 
 
-def pick_current_model(entries: List[Dict[str, Any]]) -> Tuple[Optional[str], Optional[str]]:
-    if not entries:
-        return None, None
-    sorted_entries = sorted(
-        entries,
-        key=lambda entry: entry.get("date") or "",
+def import_numpy() -> Any:
+    try:
+        import numpy
+    except ImportError as exc:
+        raise RuntimeError("--backend columnar requires numpy (pip install numpy).") from exc
+    return numpy
+
+
+class CostTable:
+    """Columnar modelBreakdowns rows: date ordinals, model codes and float64 costs.
+
+    Built once from the daily entries; filtering and per-model group-bys are
+    vectorized numpy operations. Rows without a valid date get ordinal 0.
+    """
+
+    def __init__(self, ordinals: Any, codes: Any, costs: Any, models: List[str]) -> None:
+        self.ordinals = ordinals
+        self.codes = codes
+        self.costs = costs
+        self.models = models
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Dict[str, Any]]) -> "CostTable":
+        np = import_numpy()
+        ordinals = array("q")
+        codes = array("q")
+        costs = array("d")
+        model_codes: Dict[str, int] = {}
+        day_ordinals: Dict[Any, int] = {}
+        for entry in entries:
+            breakdowns = entry.get("modelBreakdowns")
+            if not breakdowns or not isinstance(breakdowns, list):
+                continue
+            day = entry.get("date")
+            ordinal = day_ordinals.get(day) if isinstance(day, str) else 0
+            if ordinal is None:
+                parsed = parse_date(day)
+                ordinal = day_ordinals[day] = parsed.toordinal() if parsed else 0
+            for item in breakdowns:
+                if not isinstance(item, dict):
+                    continue
+                model = item.get("modelName")
+                cost = item.get("cost")
+                if not isinstance(model, str) or not isinstance(cost, (int, float)):
+                    continue
+                code = model_codes.setdefault(model, len(model_codes))
+                ordinals.append(ordinal)
+                codes.append(code)
+                costs.append(float(cost))
+        return cls(
+            np.frombuffer(ordinals, dtype=np.int64),
+            np.frombuffer(codes, dtype=np.int64),
+            np.frombuffer(costs, dtype=np.float64),
+            list(model_codes),
+        )
+
+    def __len__(self) -> int:
+        return len(self.costs)
+
+    def filter_days(self, days: Optional[int]) -> "CostTable":
+        if not days:
+            return self
+        mask = self.ordinals >= days_cutoff(days).toordinal()
+        return CostTable(self.ordinals[mask], self.codes[mask], self.costs[mask], self.models)
+
+    def totals(self) -> Dict[str, float]:
+        np = import_numpy()
+        size = len(self.models)
+        sums = np.bincount(self.codes, weights=self.costs, minlength=size)
+        present = np.bincount(self.codes, minlength=size) > 0
+        return {self.models[code]: float(sums[code]) for code in np.flatnonzero(present)}
+
+
+@dataclass
+class UsageSummary:
+    """Per-model totals, latest day per model and the current model, built in one pass.
+
+    Ties on date resolve to the entry seen last, matching a stable sort by date.
+    """
+
+    totals: Dict[str, float] = field(default_factory=dict)
+    latest_by_model: Dict[str, Tuple[str, Optional[str], Optional[float]]] = field(
+        default_factory=dict
     )
-    for entry in reversed(sorted_entries):
+    current_model: Optional[str] = None
+    current_date: Optional[str] = None
+    current_key: Optional[str] = None
+    entry_count: int = 0
+
+    def add(self, entry: Dict[str, Any]) -> None:
+        rows = entry.get(_ROW_COUNT_KEY)
+        self.entry_count += rows if isinstance(rows, int) else 1
+        day = entry.get("date")
+        day_str = day if isinstance(day, str) else None
+        key = day_str or ""
+
+        best: Optional[ModelCost] = None
         breakdowns = entry.get("modelBreakdowns")
-        if isinstance(breakdowns, list) and breakdowns:
-            scored: List[ModelCost] = []
+        if isinstance(breakdowns, list):
+            seen = set()
             for item in breakdowns:
                 if not isinstance(item, dict):
                     continue
                 model = item.get("modelName")
+                if not isinstance(model, str):
+                    continue
                 cost = item.get("cost")
-                if isinstance(model, str) and isinstance(cost, (int, float)):
-                    scored.append(ModelCost(model=model, cost=float(cost)))
-            if scored:
-                scored.sort(key=lambda item: item.cost, reverse=True)
-                return scored[0].model, entry.get("date") if isinstance(entry.get("date"), str) else None
-        models_used = entry.get("modelsUsed")
-        if isinstance(models_used, list) and models_used:
-            last = models_used[-1]
-            if isinstance(last, str):
-                return last, entry.get("date") if isinstance(entry.get("date"), str) else None
-    return None, None
+                valid = isinstance(cost, (int, float))
+                if model not in seen:
+                    seen.add(model)
+                    latest = self.latest_by_model.get(model)
+                    if latest is None or key >= latest[0]:
+                        self.latest_by_model[model] = (key, day_str, float(cost) if valid else None)
+                if not valid:
+                    continue
+                self.totals[model] = self.totals.get(model, 0.0) + float(cost)
+                if best is None or float(cost) > best.cost:
+                    best = ModelCost(model=model, cost=float(cost))
 
+        candidate = best.model if best else None
+        if candidate is None:
+            models_used = entry.get("modelsUsed")
+            if isinstance(models_used, list) and models_used and isinstance(models_used[-1], str):
+                candidate = models_used[-1]
+        if candidate is not None and (self.current_key is None or key >= self.current_key):
+            self.current_model = candidate
+            self.current_date = day_str
+            self.current_key = key
 
-def usd(value: Optional[float]) -> str:
-    if value is None:
-        return "—"
-    return f"${value:,.2f}"
+    def latest_day_cost(self, model: str) -> Tuple[Optional[str], Optional[float]]:
+        latest = self.latest_by_model.get(model)
+        if latest is None:
+            return None, None
+        return latest[1], latest[2]
 
 
-def latest_day_cost(entries: List[Dict[str, Any]], model: str) -> Tuple[Optional[str], Optional[float]]:
-    if not entries:
-        return None, None
-    sorted_entries = sorted(
-        entries,
-        key=lambda entry: entry.get("date") or "",
-    )
-    for entry in reversed(sorted_entries):
+def summarize_entries(entries: Iterable[Dict[str, Any]]) -> UsageSummary:
+    summary = UsageSummary()
+    for entry in entries:
+        summary.add(entry)
+    return summary
+
+
+def pick_current_model(entries: List[Dict[str, Any]]) -> Tuple[Optional[str], Optional[str]]:
+    summary = summarize_entries(entries)
+    return summary.current_model, summary.current_date
+
+
+def bucket_start(day: date, bucket: str) -> date:
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+@dataclass
+class CostSeries:
+    bucket: str
+    buckets: List[str]
+    models: Dict[str, List[float]]
+
+
+def build_series(entries: Iterable[Dict[str, Any]], bucket: str) -> CostSeries:
+    """Per-model cost per bucket (ISO date of the bucket start), in one pass over the rows."""
+    by_bucket: Dict[str, Dict[str, float]] = {}
+    for entry in entries:
+        day = entry.get("date")
+        parsed = parse_date(day) if isinstance(day, str) else None
+        if parsed is None:
+            continue
+        totals = by_bucket.setdefault(bucket_start(parsed, bucket).isoformat(), {})
+        for model, cost in aggregate_costs((entry,)).items():
+            totals[model] = totals.get(model, 0.0) + cost
+    keys = sorted(by_bucket)
+    models: Dict[str, List[float]] = {}
+    for index, key in enumerate(keys):
+        for model, cost in by_bucket[key].items():
+            models.setdefault(model, [0.0] * len(keys))[index] = cost
+    return CostSeries(bucket=bucket, buckets=keys, models=models)
+
+
+CACHE_VERSION = 2
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingest (
+    provider TEXT PRIMARY KEY,
+    refreshed_at REAL NOT NULL,
+    last_date TEXT
+);
+CREATE TABLE IF NOT EXISTS daily (
+    provider TEXT NOT NULL,
+    date TEXT NOT NULL,
+    models_used TEXT NOT NULL,
+    row_count INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (provider, date)
+);
+CREATE TABLE IF NOT EXISTS model_cost (
+    provider TEXT NOT NULL,
+    date TEXT NOT NULL,
+    model TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    cost REAL,
+    PRIMARY KEY (provider, date, model)
+);
+"""
+
+
+def default_cache_path() -> str:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "openclaw", "model-usage.sqlite3")
+
+
+def open_cache(path: str) -> sqlite3.Connection:
+    import sqlite3
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    if conn.execute("PRAGMA user_version").fetchone()[0] < CACHE_VERSION:
+        # Older caches lack row counts and undated rows; rebuild from codexbar.
+        conn.executescript("DROP TABLE IF EXISTS ingest; DROP TABLE IF EXISTS daily; DROP TABLE IF EXISTS model_cost;")
+        conn.execute(f"PRAGMA user_version = {CACHE_VERSION}")
+    conn.executescript(CACHE_SCHEMA)
+    return conn
+
+
+def rollup_entries(entries: Iterable[Dict[str, Any]], since: Optional[str] = None) -> Rollup:
+    """Collapse daily rows into {date: (modelsUsed, {model: cost}, rows)}, keeping first-seen order.
+
+    Rows dated before `since` are dropped. Rows without a valid date share the
+    UNDATED bucket so their cost and row count still add up like a plain run.
+    """
+    days: Rollup = {}
+    counts: Dict[str, int] = {}
+    for entry in entries:
+        day = entry.get("date")
+        if not isinstance(day, str) or parse_date(day) is None:
+            day = UNDATED
+        elif since and day < since:
+            continue
+        counts[day] = counts.get(day, 0) + 1
+        models_used, costs, _ = days.setdefault(day, ([], {}, 0))
+        used = entry.get("modelsUsed")
+        if isinstance(used, list):
+            models_used.extend(model for model in used if isinstance(model, str))
         breakdowns = entry.get("modelBreakdowns")
         if not isinstance(breakdowns, list):
             continue
         for item in breakdowns:
             if not isinstance(item, dict):
                 continue
-            if item.get("modelName") == model:
-                cost = item.get("cost") if isinstance(item.get("cost"), (int, float)) else None
-                day = entry.get("date") if isinstance(entry.get("date"), str) else None
-                return day, float(cost) if cost is not None else None
-    return None, None
+            model = item.get("modelName")
+            if not isinstance(model, str):
+                continue
+            cost = item.get("cost")
+            previous = costs.get(model)
+            if isinstance(cost, (int, float)):
+                costs[model] = (previous or 0.0) + float(cost)
+            else:
+                costs.setdefault(model, None)
+    return {day: (models_used, costs, counts[day]) for day, (models_used, costs, _) in days.items()}
+
+
+def entries_from_rollups(days: Rollup) -> List[Dict[str, Any]]:
+    """One entry per rollup, carrying its raw row count under _ROW_COUNT_KEY."""
+    entries = []
+    for day, (models_used, costs, rows) in sorted(days.items()):
+        entry: Dict[str, Any] = {} if day == UNDATED else {"date": day}
+        entry["modelsUsed"] = models_used
+        entry["modelBreakdowns"] = [
+            {"modelName": model, "cost": cost} for model, cost in costs.items()
+        ]
+        entry[_ROW_COUNT_KEY] = rows
+        entries.append(entry)
+    return entries
+
+
+def ingest_cache(
+    conn: sqlite3.Connection,
+    provider: str,
+    entries: Iterable[Dict[str, Any]],
+    now: Optional[float] = None,
+) -> None:
+    """Store rollups for days on or after the last ingested day.
+
+    The last ingested day is rewritten because codexbar keeps adding to it until
+    the day is over; earlier days are final and are never touched again.
+    """
+    row = conn.execute("SELECT last_date FROM ingest WHERE provider = ?", (provider,)).fetchone()
+    last_date = row[0] if row else None
+    days = rollup_entries(entries, since=last_date)
+    with conn:
+        if UNDATED not in days:
+            # Undated rows are re-read on every ingest; none left means none now.
+            conn.execute("DELETE FROM daily WHERE provider = ? AND date = ?", (provider, UNDATED))
+            conn.execute("DELETE FROM model_cost WHERE provider = ? AND date = ?", (provider, UNDATED))
+        for day, (models_used, costs, rows) in days.items():
+            conn.execute("DELETE FROM model_cost WHERE provider = ? AND date = ?", (provider, day))
+            conn.execute(
+                "INSERT OR REPLACE INTO daily (provider, date, models_used, row_count) "
+                "VALUES (?, ?, ?, ?)",
+                (provider, day, json.dumps(models_used), rows),
+            )
+            conn.executemany(
+                "INSERT INTO model_cost (provider, date, model, position, cost) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (provider, day, model, position, cost)
+                    for position, (model, cost) in enumerate(costs.items())
+                ],
+            )
+        newest = max([last_date or "", *days.keys()]) or None
+        conn.execute(
+            "INSERT OR REPLACE INTO ingest (provider, refreshed_at, last_date) VALUES (?, ?, ?)",
+            (provider, time.time() if now is None else now, newest),
+        )
+
+
+def read_cache(
+    conn: sqlite3.Connection, provider: str, days: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    since = days_cutoff(days).isoformat() if days else ""
+    rollups: Rollup = {}
+    for day, models_used, rows in conn.execute(
+        "SELECT date, models_used, row_count FROM daily WHERE provider = ? AND date >= ?",
+        (provider, since),
+    ):
+        rollups[day] = (json.loads(models_used), {}, rows)
+    for day, model, cost in conn.execute(
+        "SELECT date, model, cost FROM model_cost WHERE provider = ? AND date >= ? "
+        "ORDER BY date, position",
+        (provider, since),
+    ):
+        if day in rollups:
+            rollups[day][1][model] = cost
+    return entries_from_rollups(rollups)
+
+
+def merge_rollups(left: Rollup, right: Rollup) -> Rollup:
+    """Merge two rollups, deduplicating by (date, model).
+
+    Overlapping exports repeat the same day; the larger cost and row count are
+    kept since a later export of a day only ever adds to it.
+    """
+    merged = dict(left)
+    for day, (models_used, costs, rows) in right.items():
+        if day not in merged:
+            merged[day] = (list(models_used), dict(costs), rows)
+            continue
+        merged_used, merged_costs, merged_rows = merged[day]
+        merged_used = merged_used + [model for model in models_used if model not in merged_used]
+        merged_costs = dict(merged_costs)
+        for model, cost in costs.items():
+            previous = merged_costs.get(model)
+            if previous is None or (cost is not None and cost > previous):
+                merged_costs[model] = cost
+        merged[day] = (merged_used, merged_costs, max(merged_rows, rows))
+    return merged
+
+
+def rollup_input_file(
+    path: str, providers: Tuple[str, ...]
+) -> Dict[str, Rollup]:
+    """Parse one codexbar export into per-provider rollups (process pool worker)."""
+    data = read_json_input(path)
+    payloads = data if isinstance(data, list) else [data]
+    rollups: Dict[str, Rollup] = {}
+    for payload in payloads:
+        if not isinstance(payload, dict):
+            continue
+        owner = payload.get("provider")
+        for provider in providers:
+            # Bare objects without a provider apply to whichever provider was asked for.
+            if owner is not None and owner != provider:
+                continue
+            rollup = rollup_entries(parse_daily_entries(payload))
+            rollups[provider] = merge_rollups(rollups.get(provider, {}), rollup)
+    return rollups
+
+
+def merge_provider_rollups(
+    left: Dict[str, Rollup], right: Dict[str, Rollup]
+) -> Dict[str, Rollup]:
+    merged = dict(left)
+    for provider, rollup in right.items():
+        merged[provider] = merge_rollups(merged.get(provider, {}), rollup)
+    return merged
+
+
+def is_input_glob(path: Optional[str]) -> bool:
+    """True when --input is a glob pattern; an existing file like cost[1].json stays literal."""
+    return bool(path) and glob.has_magic(path) and not os.path.exists(path)
+
+
+def load_input_glob(pattern: str, providers: List[str]) -> List[Dict[str, Any]]:
+    """Parse every file matching `pattern` in parallel and reduce their rollups.
+
+    Returns a codexbar-shaped payload list (one object per provider found).
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    paths = sorted(glob.glob(os.path.expanduser(pattern), recursive=True))
+    if not paths:
+        raise RuntimeError(f"No input files match '{pattern}'.")
+    wanted = tuple(providers)
+    if len(paths) == 1:
+        merged = rollup_input_file(paths[0], wanted)
+    else:
+        workers = min(len(paths), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            partials = pool.map(rollup_input_file, paths, [wanted] * len(paths), chunksize=4)
+            merged = reduce(merge_provider_rollups, partials, {})
+    return [
+        {"provider": provider, "daily": entries_from_rollups(rollup)}
+        for provider, rollup in merged.items()
+    ]
+
+
+def cached_daily_entries(
+    provider: str, ttl: int, days: Optional[int], path: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Answer from the rollup cache, re-running codexbar only once `ttl` seconds have passed."""
+    conn = open_cache(path or default_cache_path())
+    try:
+        row = conn.execute(
+            "SELECT refreshed_at FROM ingest WHERE provider = ?", (provider,)
+        ).fetchone()
+        if row is None or time.time() - row[0] >= ttl:
+            ingest_cache(conn, provider, parse_daily_entries(load_payload(None, provider)))
+        return read_cache(conn, provider, days)
+    finally:
+        conn.close()
+
+
+def usd(value: Optional[float]) -> str:
+    if value is None:
+        return "—"
+    return f"${value:,.2f}"
+
+
+def latest_day_cost(entries: List[Dict[str, Any]], model: str) -> Tuple[Optional[str], Optional[float]]:
+    return summarize_entries(entries).latest_day_cost(model)
 
 
 def render_text_current(
@@ -243,78 +871,501 @@ def build_json_all(provider: str, totals: Dict[str, float]) -> Dict[str, Any]:
     }
 
 
-def main() -> int:
-    parser = argparse.ArgumentParser(description="Summarize CodexBar model usage from local cost logs.")
-    parser.add_argument("--provider", choices=["codex", "claude"], default="codex")
-    parser.add_argument("--mode", choices=["current", "all"], default="current")
-    parser.add_argument("--model", help="Explicit model name to report instead of auto-current.")
-    parser.add_argument("--input", help="Path to codexbar cost JSON (or '-' for stdin).")
-    parser.add_argument("--days", type=positive_int, help="Limit to last N days (based on daily rows).")
-    parser.add_argument("--format", choices=["text", "json"], default="text")
-    parser.add_argument("--pretty", action="store_true", help="Pretty-print JSON output.")
+def render_text_series(provider: str, series: CostSeries) -> str:
+    lines = [f"Provider: {provider}", f"Series ({series.bucket}):"]
+    for index, key in enumerate(series.buckets):
+        costs = sorted(
+            ((model, values[index]) for model, values in series.models.items() if values[index]),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+        detail = ", ".join(f"{model} {usd(cost)}" for model, cost in costs)
+        lines.append(f"- {key}: {usd(sum(cost for _, cost in costs))} ({detail})")
+    return "\n".join(lines)
+
+
+def build_json_series(provider: str, series: CostSeries) -> Dict[str, Any]:
+    models = sorted(series.models.items(), key=lambda item: sum(item[1]), reverse=True)
+    return {
+        "provider": provider,
+        "mode": "series",
+        "bucket": series.bucket,
+        "buckets": series.buckets,
+        "models": [
+            {"model": model, "totalCostUSD": sum(values), "costUSD": values}
+            for model, values in models
+        ],
+    }
+
 
-    args = parser.parse_args()
+class NoUsageData(Exception):
+    pass
 
+
+def load_entries(
+    args: argparse.Namespace, provider: str, data: Any, days: Optional[int]
+) -> Iterable[Dict[str, Any]]:
+    if data is not None:
+        payload = select_provider_payload(data, provider)
+    elif args.cache and not args.input:
+        return cached_daily_entries(provider, args.cache_ttl, days)
+    elif args.stream and args.input:
+        return iter_filter_by_days(stream_daily_entries(args.input, provider), days)
+    else:
+        payload = load_payload(args.input, provider)
+    return filter_by_days(parse_daily_entries(payload), days)
+
+
+def collect_usage(args: argparse.Namespace, provider: str, data: Any = None) -> Any:
+    if args.backend == "columnar":
+        # The table filters by date itself, vectorized, after one columnar build.
+        table = CostTable.from_entries(load_entries(args, provider, data, None))
+        return table.filter_days(args.days).totals()
+    return aggregate_entries(args, load_entries(args, provider, data, args.days))
+
+
+def aggregate_entries(args: argparse.Namespace, entries: Iterable[Dict[str, Any]]) -> Any:
+    # One pass over the rows; with --stream they are never held in memory.
+    if args.mode == "current":
+        return summarize_entries(entries)
+    if args.mode == "series":
+        return build_series(entries, args.bucket)
+    return aggregate_costs(entries)
+
+
+def collect_providers(
+    args: argparse.Namespace, providers: List[str]
+) -> List[Tuple[str, Any, Optional[Exception]]]:
+    """Collect usage for each provider; several providers run codexbar concurrently."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    data = None
     try:
-        payload = load_payload(args.input, args.provider)
+        if is_input_glob(args.input):
+            data = load_input_glob(args.input, providers)
+        elif len(providers) > 1 and args.input and not args.stream:
+            # Parse a shared --input (possibly stdin) once rather than once per provider.
+            data = read_json_input(args.input)
     except Exception as exc:
-        eprint(str(exc))
-        return 1
+        return [(provider, None, exc) for provider in providers]
+    if len(providers) == 1:
+        try:
+            return [(providers[0], collect_usage(args, providers[0], data), None)]
+        except Exception as exc:
+            return [(providers[0], None, exc)]
+    results: List[Tuple[str, Any, Optional[Exception]]] = []
+    with ThreadPoolExecutor(max_workers=len(providers)) as pool:
+        futures = [
+            (provider, pool.submit(collect_usage, args, provider, data)) for provider in providers
+        ]
+        for provider, future in futures:
+            try:
+                results.append((provider, future.result(), None))
+            except Exception as exc:
+                results.append((provider, None, exc))
+    return results
+
+
+class UsageWatcher:
+    """Per-day rollups for one provider, kept in memory and refreshed incrementally.
 
-    entries = parse_daily_entries(payload)
-    entries = filter_by_days(entries, args.days)
+    Each refresh only rolls up rows dated on or after the newest day already held;
+    earlier days are final and are never re-aggregated.
+    """
+
+    def __init__(self, args: argparse.Namespace, provider: str) -> None:
+        self.args = args
+        self.provider = provider
+        self.rollups: Rollup = {}
+        self.signature: Optional[Tuple[int, int]] = None
+
+    def refresh(self) -> bool:
+        """Ingest new rows from the source; returns False when --input is unchanged."""
+        if self.args.input:
+            stat = os.stat(self.args.input)
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if signature == self.signature:
+                return False
+            rows: Iterable[Dict[str, Any]] = stream_daily_entries(self.args.input, self.provider)
+        else:
+            signature = None
+            rows = parse_daily_entries(load_payload(None, self.provider))
+        since = max(self.rollups) if self.rollups else None
+        # Swap in a new dict so concurrent readers (serve) never see a partial update.
+        # Undated rows can't be resumed by date, so that bucket is rebuilt every time.
+        rollups = dict(self.rollups)
+        rollups.pop(UNDATED, None)
+        rollups.update(rollup_entries(rows, since=since))
+        self.rollups = rollups
+        self.signature = signature
+        return True
 
+    def usage(self, args: Optional[argparse.Namespace] = None) -> Any:
+        args = args or self.args
+        entries = iter_filter_by_days(entries_from_rollups(self.rollups), args.days)
+        return aggregate_entries(args, entries)
+
+
+def build_report(
+    provider: str, usage: Any, args: argparse.Namespace
+) -> Tuple[str, Dict[str, Any]]:
+    """Return (text, json payload) for one provider, or raise NoUsageData."""
     if args.mode == "current":
+        summary: UsageSummary = usage
         model = args.model
         latest_date = None
         if not model:
-            model, latest_date = pick_current_model(entries)
+            model, latest_date = summary.current_model, summary.current_date
         if not model:
-            eprint("No model data found in codexbar cost payload.")
-            return 2
-        totals = aggregate_costs(entries)
-        total_cost = totals.get(model)
-        latest_cost_date, latest_cost = latest_day_cost(entries, model)
-
-        if args.format == "json":
-            payload_out = build_json_current(
-                provider=args.provider,
-                model=model,
-                latest_date=latest_date,
-                total_cost=total_cost,
-                latest_cost=latest_cost,
-                latest_cost_date=latest_cost_date,
-                entry_count=len(entries),
-            )
-            indent = 2 if args.pretty else None
-            print(json.dumps(payload_out, indent=indent, sort_keys=args.pretty))
-        else:
-            print(
-                render_text_current(
-                    provider=args.provider,
-                    model=model,
-                    latest_date=latest_date,
-                    total_cost=total_cost,
-                    latest_cost=latest_cost,
-                    latest_cost_date=latest_cost_date,
-                    entry_count=len(entries),
-                )
-            )
-        return 0
+            raise NoUsageData("No model data found in codexbar cost payload.")
+        latest_cost_date, latest_cost = summary.latest_day_cost(model)
+        fields = dict(
+            provider=provider,
+            model=model,
+            latest_date=latest_date,
+            total_cost=summary.totals.get(model),
+            latest_cost=latest_cost,
+            latest_cost_date=latest_cost_date,
+            entry_count=summary.entry_count,
+        )
+        return render_text_current(**fields), build_json_current(**fields)
+
+    if args.mode == "series":
+        series: CostSeries = usage
+        if not series.models:
+            raise NoUsageData("No dated model breakdowns found in codexbar cost payload.")
+        return (
+            render_text_series(provider=provider, series=series),
+            build_json_series(provider=provider, series=series),
+        )
 
-    totals = aggregate_costs(entries)
+    totals: Dict[str, float] = usage
     if not totals:
-        eprint("No model breakdowns found in codexbar cost payload.")
-        return 2
+        raise NoUsageData("No model breakdowns found in codexbar cost payload.")
+    return (
+        render_text_all(provider=provider, totals=totals),
+        build_json_all(provider=provider, totals=totals),
+    )
+
+
+def render_results(
+    args: argparse.Namespace, results: List[Tuple[str, Any, Optional[Exception]]]
+) -> Tuple[int, List[str], Optional[str]]:
+    """Render collected usage into (exit status, error lines, output or None)."""
+    texts: List[str] = []
+    payloads: List[Dict[str, Any]] = []
+    errors: List[str] = []
+    status = 0
+    for provider, usage, error in results:
+        prefix = f"{provider}: " if len(results) > 1 else ""
+        if error is not None:
+            errors.append(f"{prefix}{error}")
+            status = status or 1
+            continue
+        try:
+            text, payload_out = build_report(provider, usage, args)
+        except NoUsageData as exc:
+            errors.append(f"{prefix}{exc}")
+            status = status or 2
+            continue
+        texts.append(text)
+        payloads.append(payload_out)
+
+    # With --provider all, report whatever providers had data.
+    if not payloads:
+        return status, errors, None
 
     if args.format == "json":
-        payload_out = build_json_all(provider=args.provider, totals=totals)
+        if args.provider == "all":
+            payload_out = {"provider": "all", "mode": args.mode, "providers": payloads}
+        else:
+            payload_out = payloads[0]
         indent = 2 if args.pretty else None
-        print(json.dumps(payload_out, indent=indent, sort_keys=args.pretty))
-    else:
-        print(render_text_all(provider=args.provider, totals=totals))
+        return 0, errors, json.dumps(payload_out, indent=indent, sort_keys=args.pretty)
+    return 0, errors, "\n\n".join(texts)
+
+
+def watch(args: argparse.Namespace, providers: List[str]) -> int:
+    """Re-poll every --watch seconds and print the report whenever it changes."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    watchers = [UsageWatcher(args, provider) for provider in providers]
+    last: Optional[Tuple[List[str], Optional[str]]] = None
+    last_day: Optional[date] = None
+    with ThreadPoolExecutor(max_workers=len(watchers)) as pool:
+        try:
+            while True:
+                futures = [pool.submit(watcher.refresh) for watcher in watchers]
+                results: List[Tuple[str, Any, Optional[Exception]]] = []
+                changed = date.today() != last_day
+                for watcher, future in zip(watchers, futures):
+                    try:
+                        changed = future.result() or changed
+                        results.append((watcher.provider, watcher.usage(), None))
+                    except Exception as exc:
+                        changed = True
+                        results.append((watcher.provider, None, exc))
+                if changed:
+                    last_day = date.today()
+                    _, errors, output = render_results(args, results)
+                    if (errors, output) != last:
+                        last = (errors, output)
+                        for error in errors:
+                            eprint(error)
+                        if output is not None:
+                            print(output, flush=True)
+                time.sleep(args.watch)
+        except KeyboardInterrupt:
+            return 0
+
+
+SERVE_MODES = {"/current": "current", "/all": "all", "/series": "series"}
+
+
+class UsageIndex:
+    """In-memory usage index for `serve`, refreshed in the background.
+
+    Rendered responses are memoized per query until the next refresh changes
+    the data, so concurrent clients asking the same question cost one render.
+    """
+
+    def __init__(self, args: argparse.Namespace, providers: List[str]) -> None:
+        self.providers = providers
+        self.watchers = {provider: UsageWatcher(args, provider) for provider in providers}
+        self.errors: Dict[str, Optional[Exception]] = {provider: None for provider in providers}
+        self.responses: Dict[str, Tuple[int, str, bytes]] = {}
+        self.day = date.today()
+        self.lock = threading.Lock()
+
+    def refresh(self) -> None:
+        from concurrent.futures import ThreadPoolExecutor
+
+        changed = False
+        with ThreadPoolExecutor(max_workers=len(self.watchers)) as pool:
+            futures = {
+                provider: pool.submit(watcher.refresh) for provider, watcher in self.watchers.items()
+            }
+        for provider, future in futures.items():
+            try:
+                changed = future.result() or changed
+                self.errors[provider] = None
+            except Exception as exc:
+                eprint(f"{provider}: {exc}")
+                self.errors[provider] = exc
+                changed = True
+        if changed:
+            with self.lock:
+                self.responses = {}
+
+    def refresh_forever(self, interval: int) -> None:
+        while True:
+            time.sleep(interval)
+            self.refresh()
+
+    def respond(self, path: str, query: str) -> Tuple[int, str, bytes]:
+        """Return (HTTP status, ETag, JSON body) for a query."""
+        key = f"{path}?{query}"
+        with self.lock:
+            if date.today() != self.day:
+                # --days windows move at midnight.
+                self.day = date.today()
+                self.responses = {}
+            responses = self.responses
+            cached = responses.get(key)
+        if cached is not None:
+            return cached
+        code, payload = self._render(path, query)
+        body = json.dumps(payload).encode("utf-8")
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        with self.lock:
+            if self.responses is responses:
+                responses[key] = (code, etag, body)
+        return code, etag, body
+
+    def _render(self, path: str, query: str) -> Tuple[int, Dict[str, Any]]:
+        mode = SERVE_MODES.get(path)
+        if mode is None:
+            return 404, {"error": f"Unknown path {path}; use {', '.join(SERVE_MODES)}."}
+        params = {name: values[-1] for name, values in parse_qs(query).items()}
+        provider = params.get("provider", self.providers[0] if len(self.providers) == 1 else "all")
+        if provider != "all" and provider not in self.providers:
+            return 400, {"error": f"Provider must be one of: {', '.join(self.providers)}, all."}
+        bucket = params.get("bucket", "day")
+        if bucket not in BUCKETS:
+            return 400, {"error": f"bucket must be one of: {', '.join(BUCKETS)}."}
+        try:
+            days = positive_int(params["days"]) if "days" in params else None
+        except argparse.ArgumentTypeError as exc:
+            return 400, {"error": f"days {exc}"}
+
+        args = argparse.Namespace(
+            mode=mode,
+            provider=provider,
+            model=params.get("model"),
+            days=days,
+            bucket=bucket,
+            format="json",
+            pretty=False,
+        )
+        results: List[Tuple[str, Any, Optional[Exception]]] = []
+        for name in self.providers if provider == "all" else [provider]:
+            watcher = self.watchers[name]
+            error = self.errors[name]
+            if error is not None and not watcher.rollups:
+                results.append((name, None, error))
+            else:
+                results.append((name, watcher.usage(args), None))
+        status, errors, output = render_results(args, results)
+        if output is None:
+            return (404 if status == 2 else 502), {"error": "; ".join(errors)}
+        return 200, json.loads(output)
+
+
+def make_handler(index: UsageIndex) -> type:
+    from http.server import BaseHTTPRequestHandler
+
+    class UsageRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            path, _, query = self.path.partition("?")
+            code, etag, body = index.respond(path, query)
+            tags = [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]
+            if code == 200 and etag in tags:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    return UsageRequestHandler
+
+
+def serve_main(argv: List[str]) -> int:
+    from http.server import ThreadingHTTPServer
+
+    parser = argparse.ArgumentParser(
+        prog="model_usage.py serve",
+        description="Serve model usage summaries over local HTTP/JSON.",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address (default: 127.0.0.1).")
+    parser.add_argument("--port", type=non_negative_int, default=DEFAULT_SERVE_PORT)
+    parser.add_argument(
+        "--provider",
+        choices=[*PROVIDERS, "all"],
+        default="all",
+        help="Providers to index (default: all).",
+    )
+    parser.add_argument("--input", help="Path to codexbar cost JSON instead of running codexbar.")
+    parser.add_argument(
+        "--refresh",
+        type=positive_int,
+        default=60,
+        metavar="SECONDS",
+        help="Background refresh interval (default: 60).",
+    )
+    args = parser.parse_args(argv)
+    if args.input and (args.input == "-" or is_input_glob(args.input)):
+        parser.error("serve needs a single --input file or codexbar")
+    args.days = None
+
+    providers = list(PROVIDERS) if args.provider == "all" else [args.provider]
+    index = UsageIndex(args, providers)
+    index.refresh()
+    threading.Thread(target=index.refresh_forever, args=(args.refresh,), daemon=True).start()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(index))
+    host, port = server.server_address[:2]
+    eprint(f"Serving model usage on http://{host}:{port} ({', '.join(SERVE_MODES)})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
     return 0
 
 
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "serve":
+        return serve_main(argv[1:])
+
+    parser = argparse.ArgumentParser(description="Summarize CodexBar model usage from local cost logs.")
+    parser.add_argument(
+        "--provider",
+        choices=[*PROVIDERS, "all"],
+        default="codex",
+        help="Provider to summarize; 'all' collects every provider concurrently.",
+    )
+    parser.add_argument("--mode", choices=["current", "all", "series"], default="current")
+    parser.add_argument(
+        "--bucket",
+        choices=BUCKETS,
+        default="day",
+        help="Time bucket for --mode series (weeks start on Monday).",
+    )
+    parser.add_argument("--model", help="Explicit model name to report instead of auto-current.")
+    parser.add_argument(
+        "--input",
+        help="Path to codexbar cost JSON, '-' for stdin, or a quoted glob such as 'exports/**/*.json'.",
+    )
+    parser.add_argument("--days", type=positive_int, help="Limit to last N days (based on daily rows).")
+    parser.add_argument("--format", choices=["text", "json"], default="text")
+    parser.add_argument("--pretty", action="store_true", help="Pretty-print JSON output.")
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream daily rows from --input instead of loading the whole file into memory.",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Answer from a local per-day rollup cache instead of re-running codexbar every call.",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=non_negative_int,
+        default=DEFAULT_CACHE_TTL,
+        help=f"Seconds before --cache re-runs codexbar (default: {DEFAULT_CACHE_TTL}).",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["rows", "columnar"],
+        default="rows",
+        help="Aggregation backend; 'columnar' uses numpy arrays (--mode all only).",
+    )
+    parser.add_argument(
+        "--watch",
+        type=positive_int,
+        metavar="SECONDS",
+        help="Keep running, re-poll codexbar (or stat --input) every SECONDS and print on change.",
+    )
+
+    args = parser.parse_args(argv)
+    if args.watch and args.input and (args.input == "-" or is_input_glob(args.input)):
+        parser.error("--watch needs a single --input file or codexbar")
+    if args.backend == "columnar" and args.mode != "all":
+        parser.error("--backend columnar supports --mode all only")
+    if args.provider == "all" and args.stream and args.input == "-":
+        parser.error("--stream with --provider all needs an --input file, not stdin")
+
+    providers = list(PROVIDERS) if args.provider == "all" else [args.provider]
+    if args.watch:
+        return watch(args, providers)
+    status, errors, output = render_results(args, collect_providers(args, providers))
+    for error in errors:
+        eprint(error)
+    if output is not None:
+        print(output)
+    return status
+
+
 if __name__ == "__main__":
     raise SystemExit(main())
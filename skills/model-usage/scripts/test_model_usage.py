@@ -4,10 +4,38 @@ Tests for model_usage helpers.
 """
 
 import argparse
+import io
+import json
+import os
+import sqlite3
+import tempfile
 from datetime import date, timedelta
-from unittest import TestCase, main
+from unittest import TestCase, main, skipUnless
 
-from model_usage import filter_by_days, positive_int
+from bench_model_usage import row_count, write_synthetic_payload
+from model_usage import (
+    CACHE_SCHEMA,
+    CostTable,
+    UsageIndex,
+    UsageWatcher,
+    aggregate_costs,
+    build_series,
+    collect_providers,
+    filter_by_days,
+    ingest_cache,
+    is_input_glob,
+    iter_stream_daily_entries,
+    load_input_glob,
+    positive_int,
+    read_cache,
+    render_results,
+    summarize_entries,
+)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class TestModelUsage(TestCase):
@@ -35,6 +63,359 @@ class TestModelUsage(TestCase):
         self.assertEqual(filtered[0]["date"], (today - timedelta(days=1)).strftime("%Y-%m-%d"))
         self.assertEqual(filtered[1]["date"], today.strftime("%Y-%m-%d"))
 
+    def test_stream_daily_entries_matches_provider_across_chunks(self):
+        payload = [
+            {"provider": "claude", "daily": [{"date": "2025-01-01", "modelBreakdowns": []}]},
+            {
+                "daily": [
+                    {"date": "2025-01-02", "modelBreakdowns": [{"modelName": "a", "cost": 1.25}]},
+                    "not-a-row",
+                    {"date": "2025-01-03", "modelBreakdowns": [{"modelName": "b", "cost": 10}]},
+                ],
+                "provider": "codex",
+                "totals": {"totalCost": 11.25},
+            },
+        ]
+        raw = json.dumps(payload, indent=2)
+        for chunk_size in (1, 5, 4096):
+            entries = list(iter_stream_daily_entries(io.StringIO(raw), "codex", chunk_size))
+            self.assertEqual([entry["date"] for entry in entries], ["2025-01-02", "2025-01-03"])
+            self.assertEqual(entries[1]["modelBreakdowns"][0]["cost"], 10)
+
+    def test_stream_daily_entries_reads_numbers_split_across_chunks(self):
+        daily = [
+            {
+                "date": f"2025-01-{day:02d}",
+                "sessionCostUSD": 12.34 * day,
+                "totalTokens": 1e5 + day,
+                "modelBreakdowns": [{"modelName": "opus", "cost": -0.5e-3 * day}],
+            }
+            for day in range(1, 10)
+        ]
+        payload = {"provider": "codex", "daily": daily}
+        # Scalars directly in the provider object are decoded on their own.
+        payload.update({f"sessionCostUSD{i}": 12.34 * 10**i for i in range(8)})
+        payload.update({f"tokens{i}": 1.5e5 + i for i in range(8)})
+        raw = json.dumps(payload, indent=4)
+        for chunk_size in (16, 32):
+            entries = list(iter_stream_daily_entries(io.StringIO(raw), "codex", chunk_size))
+            self.assertEqual(entries, daily)
+
+    def test_stream_daily_entries_rejects_missing_provider(self):
+        raw = json.dumps([{"provider": "claude", "daily": []}])
+        with self.assertRaises(RuntimeError):
+            list(iter_stream_daily_entries(io.StringIO(raw), "codex"))
+
+    def test_summarize_entries_single_pass_current_model(self):
+        entries = [
+            {"date": "2025-01-03", "modelBreakdowns": [{"modelName": "a", "cost": 1}]},
+            {"date": "2025-01-01", "modelBreakdowns": [{"modelName": "b", "cost": 9}]},
+            {
+                "date": "2025-01-03",
+                "modelBreakdowns": [{"modelName": "b", "cost": 2}, {"modelName": "c", "cost": 2}],
+            },
+            {"date": "2025-01-02", "modelsUsed": ["d"]},
+        ]
+
+        summary = summarize_entries(iter(entries))
+
+        self.assertEqual(summary.current_model, "b")
+        self.assertEqual(summary.current_date, "2025-01-03")
+        self.assertEqual(summary.totals, {"a": 1.0, "b": 11.0, "c": 2.0})
+        self.assertEqual(summary.latest_day_cost("b"), ("2025-01-03", 2.0))
+        self.assertEqual(summary.latest_day_cost("a"), ("2025-01-03", 1.0))
+        self.assertEqual(summary.latest_day_cost("d"), (None, None))
+        self.assertEqual(summary.entry_count, 4)
+
+    def test_cache_only_rewrites_days_from_last_ingested(self):
+        conn = sqlite3.connect(":memory:")
+        conn.executescript(CACHE_SCHEMA)
+        ingest_cache(
+            conn,
+            "codex",
+            [
+                {"date": "2025-01-01", "modelBreakdowns": [{"modelName": "a", "cost": 1}]},
+                {"date": "2025-01-02", "modelBreakdowns": [{"modelName": "a", "cost": 2}]},
+            ],
+        )
+        ingest_cache(
+            conn,
+            "codex",
+            [
+                {"date": "2025-01-01", "modelBreakdowns": [{"modelName": "a", "cost": 100}]},
+                {"date": "2025-01-02", "modelBreakdowns": [{"modelName": "a", "cost": 3}]},
+                {
+                    "date": "2025-01-03",
+                    "modelsUsed": ["b"],
+                    "modelBreakdowns": [{"modelName": "b", "cost": 4}, {"modelName": "b", "cost": 1}],
+                },
+            ],
+        )
+
+        entries = read_cache(conn, "codex")
+
+        self.assertEqual([entry["date"] for entry in entries], ["2025-01-01", "2025-01-02", "2025-01-03"])
+        self.assertEqual(entries[0]["modelBreakdowns"], [{"modelName": "a", "cost": 1.0}])
+        self.assertEqual(entries[1]["modelBreakdowns"], [{"modelName": "a", "cost": 3.0}])
+        self.assertEqual(entries[2]["modelBreakdowns"], [{"modelName": "b", "cost": 5.0}])
+        self.assertEqual(entries[2]["modelsUsed"], ["b"])
+        self.assertEqual(read_cache(conn, "claude"), [])
+
+    def test_collect_providers_reads_every_provider_from_input(self):
+        payload = [
+            {
+                "provider": provider,
+                "daily": [{"date": "2025-01-01", "modelBreakdowns": [{"modelName": model, "cost": cost}]}],
+            }
+            for provider, model, cost in (("codex", "a", 1), ("claude", "b", 2))
+        ]
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as handle:
+            json.dump(payload, handle)
+            handle.flush()
+            args = argparse.Namespace(
+                input=handle.name,
+                stream=False,
+                cache=False,
+                days=None,
+                mode="all",
+                backend="rows",
+            )
+
+            results = collect_providers(args, ["codex", "claude"])
+
+        self.assertEqual(results, [("codex", {"a": 1.0}, None), ("claude", {"b": 2.0}, None)])
+
+    def test_single_provider_object_only_answers_for_its_provider(self):
+        daily = [{"date": "2025-01-01", "modelBreakdowns": [{"modelName": "a", "cost": 1}]}]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            owned = f"{tmpdir}/codex.json"
+            bare = f"{tmpdir}/bare.json"
+            with open(owned, "w", encoding="utf-8") as handle:
+                json.dump({"provider": "codex", "daily": daily}, handle)
+            with open(bare, "w", encoding="utf-8") as handle:
+                json.dump({"daily": daily}, handle)
+
+            for stream in (False, True):
+                args = argparse.Namespace(
+                    input=owned, stream=stream, cache=False, days=None, mode="all", backend="rows"
+                )
+                results = collect_providers(args, ["codex", "claude"])
+                self.assertEqual(results[0], ("codex", {"a": 1.0}, None))
+                self.assertEqual(results[1][:2], ("claude", None))
+                self.assertIn("Provider 'claude' not found", str(results[1][2]))
+
+                args.input = bare
+                self.assertEqual(
+                    collect_providers(args, ["codex", "claude"]),
+                    [("codex", {"a": 1.0}, None), ("claude", {"a": 1.0}, None)],
+                )
+
+    @skipUnless(numpy, "numpy not installed")
+    def test_cost_table_matches_row_aggregation(self):
+        today = date.today()
+        entries = [
+            {
+                "date": (today - timedelta(days=offset)).strftime("%Y-%m-%d"),
+                "modelBreakdowns": [
+                    {"modelName": f"m{offset % 3}", "cost": offset + 0.5},
+                    {"modelName": "skip", "cost": "n/a"},
+                ],
+            }
+            for offset in range(10)
+        ]
+        entries.append({"modelBreakdowns": [{"modelName": "undated", "cost": 1}]})
+
+        table = CostTable.from_entries(entries)
+
+        self.assertEqual(len(table), 11)
+        self.assertEqual(table.totals(), aggregate_costs(entries))
+        self.assertEqual(table.filter_days(3).totals(), aggregate_costs(filter_by_days(entries, 3)))
+
+    def test_build_series_buckets_by_week_and_month(self):
+        entries = [
+            {"date": "2025-01-31", "modelBreakdowns": [{"modelName": "a", "cost": 1}]},
+            {"date": "2025-02-02", "modelBreakdowns": [{"modelName": "b", "cost": 2}]},
+            {"date": "2025-02-03", "modelBreakdowns": [{"modelName": "a", "cost": 4}]},
+            {"modelBreakdowns": [{"modelName": "a", "cost": 100}]},
+        ]
+
+        weekly = build_series(iter(entries), "week")
+        monthly = build_series(entries, "month")
+
+        self.assertEqual(weekly.buckets, ["2025-01-27", "2025-02-03"])
+        self.assertEqual(weekly.models, {"a": [1.0, 4.0], "b": [2.0, 0.0]})
+        self.assertEqual(monthly.buckets, ["2025-01-01", "2025-02-01"])
+        self.assertEqual(monthly.models, {"a": [1.0, 4.0], "b": [0.0, 2.0]})
+
+    def test_usage_watcher_only_reaggregates_new_days(self):
+        def write(path, daily):
+            with open(path, "w", encoding="utf-8") as handle:
+                json.dump({"provider": "codex", "daily": daily}, handle)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = f"{tmpdir}/cost.json"
+            write(path, [
+                {"date": "2025-01-01", "modelBreakdowns": [{"modelName": "a", "cost": 1}]},
+                {"date": "2025-01-02", "modelBreakdowns": [{"modelName": "a", "cost": 2}]},
+            ])
+            args = argparse.Namespace(input=path, provider="codex", days=None, mode="all")
+            watcher = UsageWatcher(args, "codex")
+
+            self.assertTrue(watcher.refresh())
+            self.assertFalse(watcher.refresh())
+            self.assertEqual(watcher.usage(), {"a": 3.0})
+
+            write(path, [
+                {"date": "2025-01-01", "modelBreakdowns": [{"modelName": "a", "cost": 50}]},
+                {"date": "2025-01-02", "modelBreakdowns": [{"modelName": "a", "cost": 5}]},
+                {"date": "2025-01-03", "modelBreakdowns": [{"modelName": "b", "cost": 7}]},
+            ])
+
+            self.assertTrue(watcher.refresh())
+            self.assertEqual(watcher.usage(), {"a": 6.0, "b": 7.0})
+
+    def test_usage_index_memoizes_responses_with_stable_etag(self):
+        payload = [
+            {"provider": "codex", "daily": [{"date": "2025-01-01", "modelBreakdowns": [{"modelName": "a", "cost": 1}]}]},
+        ]
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as handle:
+            json.dump(payload, handle)
+            handle.flush()
+            index = UsageIndex(argparse.Namespace(input=handle.name, days=None), ["codex"])
+            index.refresh()
+
+            code, etag, body = index.respond("/all", "provider=codex")
+            again = index.respond("/all", "provider=codex")
+            bad = index.respond("/all", "provider=claude")
+
+        self.assertEqual(code, 200)
+        self.assertEqual(again, (code, etag, body))
+        self.assertEqual(json.loads(body)["models"], [{"model": "a", "totalCostUSD": 1.0}])
+        self.assertEqual(bad[0], 400)
+
+    def test_usage_index_current_matches_cli_row_count(self):
+        daily = [
+            {"date": "2025-01-01", "modelBreakdowns": [{"modelName": "a", "cost": 1}]},
+            {"date": "2025-01-01", "modelBreakdowns": [{"modelName": "b", "cost": 2}]},
+            {"date": "2025-01-02", "modelBreakdowns": [{"modelName": "a", "cost": 3}]},
+            {"modelBreakdowns": [{"modelName": "a", "cost": 4}]},
+        ]
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as handle:
+            json.dump({"provider": "codex", "daily": daily}, handle)
+            handle.flush()
+            args = argparse.Namespace(
+                input=handle.name,
+                provider="codex",
+                stream=False,
+                cache=False,
+                days=None,
+                mode="current",
+                model=None,
+                backend="rows",
+                format="json",
+                pretty=False,
+            )
+            _, _, output = render_results(args, collect_providers(args, ["codex"]))
+            index = UsageIndex(argparse.Namespace(input=handle.name, days=None), ["codex"])
+            index.refresh()
+            code, _, body = index.respond("/current", "provider=codex")
+
+        self.assertEqual(code, 200)
+        self.assertEqual(json.loads(body), json.loads(output))
+        self.assertEqual(json.loads(body)["dailyRowCount"], 4)
+
+    def test_existing_input_with_glob_characters_is_literal(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = f"{tmpdir}/cost[1].json"
+            with open(path, "w", encoding="utf-8") as handle:
+                json.dump(
+                    {"provider": "codex", "daily": [
+                        {"date": "2025-01-01", "modelBreakdowns": [{"modelName": "a", "cost": 1}]},
+                    ]},
+                    handle,
+                )
+            args = argparse.Namespace(
+                input=path, stream=False, cache=False, days=None, mode="all", backend="rows"
+            )
+
+            self.assertFalse(is_input_glob(path))
+            self.assertTrue(is_input_glob(f"{tmpdir}/cost[0-9].json"))
+            self.assertFalse(is_input_glob(None))
+            self.assertEqual(collect_providers(args, ["codex"]), [("codex", {"a": 1.0}, None)])
+
+    def test_load_input_glob_dedups_by_provider_date_model(self):
+        def day(date_str, model, cost):
+            return {"date": date_str, "modelBreakdowns": [{"modelName": model, "cost": cost}]}
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            exports = {
+                "a/1.json": [
+                    {"provider": "codex", "daily": [day("2025-01-01", "a", 1), day("2025-01-02", "a", 2)]},
+                    {"provider": "claude", "daily": [day("2025-01-01", "c", 4)]},
+                ],
+                "b/2.json": {"provider": "codex", "daily": [day("2025-01-02", "a", 3), day("2025-01-02", "b", 1)]},
+            }
+            for name, payload in exports.items():
+                path = f"{tmpdir}/{name}"
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "w", encoding="utf-8") as handle:
+                    json.dump(payload, handle)
+
+            merged = load_input_glob(f"{tmpdir}/**/*.json", ["codex", "claude"])
+
+        by_provider = {payload["provider"]: payload["daily"] for payload in merged}
+        self.assertEqual(aggregate_costs(by_provider["codex"]), {"a": 4.0, "b": 1.0})
+        self.assertEqual(aggregate_costs(by_provider["claude"]), {"c": 4.0})
+
+    def test_rollup_paths_match_plain_row_count_and_totals(self):
+        daily = [
+            {"date": "2025-01-01", "modelBreakdowns": [{"modelName": "a", "cost": 1}]},
+            {"date": "2025-01-01", "modelBreakdowns": [{"modelName": "b", "cost": 2}]},
+            {"date": "2025-01-02", "modelBreakdowns": [{"modelName": "a", "cost": 3}]},
+            {"modelBreakdowns": [{"modelName": "u", "cost": 9}]},
+        ]
+        plain = summarize_entries(iter(daily))
+        self.assertEqual(plain.entry_count, 4)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = f"{tmpdir}/cost.json"
+            with open(path, "w", encoding="utf-8") as handle:
+                json.dump({"provider": "codex", "daily": daily}, handle)
+            watcher = UsageWatcher(
+                argparse.Namespace(input=path, provider="codex", days=None, mode="current"), "codex"
+            )
+            watcher.refresh()
+            (globbed,) = load_input_glob(f"{tmpdir}/*.json", ["codex"])
+
+        conn = sqlite3.connect(":memory:")
+        conn.executescript(CACHE_SCHEMA)
+        ingest_cache(conn, "codex", daily)
+
+        for summary in (
+            watcher.usage(),
+            summarize_entries(iter(read_cache(conn, "codex"))),
+            summarize_entries(iter(globbed["daily"])),
+        ):
+            self.assertEqual(summary.entry_count, plain.entry_count)
+            self.assertEqual(summary.totals, plain.totals)
+            self.assertEqual(summary.totals["u"], 9.0)
+
+        # Undated rows are rewritten on every ingest, not only appended to.
+        ingest_cache(conn, "codex", daily[:3])
+        self.assertNotIn("u", summarize_entries(iter(read_cache(conn, "codex"))).totals)
+
+    def test_synthetic_payload_has_requested_breakdown_rows(self):
+        handle = io.StringIO()
+
+        entries = write_synthetic_payload(handle, 1000, seed=1)
+
+        handle.seek(0)
+        daily = list(iter_stream_daily_entries(handle, "codex"))
+        self.assertEqual(len(daily), entries)
+        self.assertEqual(sum(len(entry["modelBreakdowns"]) for entry in daily), 1000)
+        self.assertEqual(row_count("10M"), 10_000_000)
+        self.assertEqual(row_count("1k"), 1000)
+
 
 if __name__ == "__main__":
     main()
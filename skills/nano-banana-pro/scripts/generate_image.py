@@ -17,10 +17,21 @@ Multi-image editing (up to 14 images):
 """
 
 import argparse
+import asyncio
+import contextlib
+import json
+import math
 import os
 import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 from pathlib import Path
 
+RESOLUTIONS = ("1K", "2K", "4K")
+
 
 def get_api_key(provided_key: str | None) -> str | None:
     """Get API key from argument first, then environment."""
@@ -29,18 +40,334 @@ def get_api_key(provided_key: str | None) -> str | None:
     return os.environ.get("GEMINI_API_KEY")
 
 
-def main():
+MODEL = "gemini-3-pro-image-preview"
+MAX_INPUT_IMAGES = 14
+DEFAULT_WORKERS = 4
+DEFAULT_TIMEOUT = 600.0
+# Longest edge each output resolution can make use of; larger inputs are downscaled before upload.
+RESOLUTION_EDGES = {"1K": 1024, "2K": 2048, "4K": 4096}
+UPLOAD_QUALITY = 90
+# Input formats the API takes as-is; an in-bounds input in one of these is uploaded unchanged.
+UPLOAD_MIME_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+EXIF_ORIENTATION = 0x0112
+
+
+class GenerationError(Exception):
+    """A job failed in a way worth reporting without a traceback."""
+
+
+def pick_resolution(requested: str, max_input_dim: int, log=print) -> str:
+    """Auto-detect resolution from the largest input if the default 1K was left in place."""
+    if requested != "1K" or max_input_dim <= 0:
+        return requested
+    if max_input_dim >= 3000:
+        resolution = "4K"
+    elif max_input_dim >= 1500:
+        resolution = "2K"
+    else:
+        resolution = "1K"
+    log(f"Auto-detected resolution: {resolution} (from max input dimension {max_input_dim})")
+    return resolution
+
+
+def probe_size(img_path: str) -> tuple[int, int]:
+    """Read an input image's dimensions from its header without decoding pixels."""
+    from PIL import Image as PILImage
+
+    try:
+        # Image.open is lazy: it parses the header and defers decoding to load().
+        with PILImage.open(img_path) as img:
+            return img.size
+    except Exception as e:
+        raise GenerationError(f"Could not load input image '{img_path}': {e}") from e
+
+
+def encode_input(img_path: str, max_edge: int) -> tuple[bytes, str, tuple[int, int]]:
+    """Prepare one input for upload, downscaled to fit `max_edge`; returns (data, mime_type, size).
+
+    An upright JPEG, PNG or WebP that already fits is sent byte for byte, so
+    it is neither decoded nor made larger or lossy. Anything else is decoded,
+    at a reduced DCT scale for JPEGs much larger than needed, and re-encoded:
+    opaque images as JPEG, images with transparency as WebP, which keeps the
+    alpha channel at a fraction of PNG's size. Pixel buffers are released
+    before returning, so only the encoded bytes stay in memory.
+    """
+    from PIL import Image as PILImage
+    from PIL import ImageOps
+
+    try:
+        with PILImage.open(img_path) as img:
+            width, height = img.size
+            original_mime_type = UPLOAD_MIME_TYPES.get(img.format)
+            upright = img.getexif().get(EXIF_ORIENTATION, 1) == 1
+            if max(width, height) <= max_edge and original_mime_type and upright:
+                return Path(img_path).read_bytes(), original_mime_type, (width, height)
+            if max(width, height) > max_edge:
+                scale = max_edge / max(width, height)
+                img.draft("RGB", (math.ceil(width * scale), math.ceil(height * scale)))
+            if not upright:
+                # In place, so the rotated pixels replace the decoded ones rather than doubling them.
+                ImageOps.exif_transpose(img, in_place=True)
+            if max(img.size) > max_edge:
+                img.thumbnail((max_edge, max_edge), PILImage.Resampling.LANCZOS)
+            buffer = BytesIO()
+            if img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info:
+                img.convert("RGBA").save(buffer, "WEBP", quality=UPLOAD_QUALITY)
+                mime_type = "image/webp"
+            else:
+                img.convert("RGB").save(buffer, "JPEG", quality=UPLOAD_QUALITY, optimize=True)
+                mime_type = "image/jpeg"
+            size = img.size
+            img.close()
+    except Exception as e:
+        raise GenerationError(f"Could not load input image '{img_path}': {e}") from e
+    return buffer.getvalue(), mime_type, size
+
+
+def build_request(prompt: str, input_paths: list[str] | None = None, resolution: str = "1K", log=print):
+    """Probe and preprocess inputs and return (contents, config) for one generate_content call."""
+    from google.genai import types
+
+    # Load input images if provided (up to 14 supported by Nano Banana Pro)
+    parts = []
+    output_resolution = resolution
+    if input_paths:
+        if len(input_paths) > MAX_INPUT_IMAGES:
+            raise GenerationError(f"Too many input images ({len(input_paths)}). Maximum is {MAX_INPUT_IMAGES}.")
+
+        sizes = [probe_size(img_path) for img_path in input_paths]
+        for img_path in input_paths:
+            log(f"Loaded input image: {img_path}")
+
+        # Track largest dimension for auto-resolution
+        max_input_dim = max(max(size) for size in sizes)
+        output_resolution = pick_resolution(resolution, max_input_dim, log)
+
+        # The model never uses more pixels than its output resolution, so upload no more.
+        # Each worker holds at most one decoded image at a time.
+        max_edge = RESOLUTION_EDGES[output_resolution]
+        with ThreadPoolExecutor(max_workers=min(len(input_paths), os.cpu_count() or 1)) as pool:
+            encoded = list(pool.map(lambda img_path: encode_input(img_path, max_edge), input_paths))
+        for img_path, (width, height), (data, mime_type, new_size) in zip(input_paths, sizes, encoded):
+            log(f"Prepared input image: {img_path} ({width}x{height} -> {new_size[0]}x{new_size[1]}, {len(data) / 1024:,.1f} KB {mime_type})")
+            parts.append(types.Part.from_bytes(data=data, mime_type=mime_type))
+
+    # Build contents (images first if editing, prompt only if generating)
+    if parts:
+        contents = [*parts, prompt]
+        img_count = len(parts)
+        log(f"Processing {img_count} image{'s' if img_count > 1 else ''} with resolution {output_resolution}...")
+    else:
+        contents = prompt
+        log(f"Generating image with resolution {output_resolution}...")
+
+    config = types.GenerateContentConfig(
+        response_modalities=["TEXT", "IMAGE"],
+        image_config=types.ImageConfig(
+            image_size=output_resolution
+        )
+    )
+    return contents, config
+
+
+def write_png(image_data: bytes, output_path: Path) -> None:
+    """Write image bytes to `output_path` as an RGB PNG, converting only when needed.
+
+    Image.open only parses the header, so an RGB PNG (the common case) is
+    written to disk byte for byte without being decoded. Anything else is
+    decoded once, flattened onto white if it has alpha, and encoded straight
+    into the output file. Both paths write a temp file and rename it into place.
+    """
+    from PIL import Image as PILImage
+
+    fd, tmp_name = tempfile.mkstemp(dir=output_path.parent, prefix=f".{output_path.name}.", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as handle, PILImage.open(BytesIO(image_data)) as image:
+            if image.format == "PNG" and image.mode == "RGB":
+                handle.write(image_data)
+            # Ensure RGB mode for PNG (convert RGBA to RGB with white background if needed)
+            elif image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info:
+                rgba = image.convert("RGBA")
+                rgb_image = PILImage.new("RGB", rgba.size, (255, 255, 255))
+                rgb_image.paste(rgba, mask=rgba.getchannel("A"))
+                del rgba
+                rgb_image.save(handle, "PNG")
+            elif image.mode == "RGB":
+                image.save(handle, "PNG")
+            else:
+                image.convert("RGB").save(handle, "PNG")
+        os.replace(tmp_name, output_path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp_name)
+        raise
+
+
+def save_response(response, filename: str, log=print) -> Path:
+    """Save the image part of a generate_content response as PNG; returns the saved path."""
+    # Set up output path
+    output_path = Path(filename)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Process response and convert to PNG
+    image_saved = False
+    for part in response.parts or []:
+        if part.text is not None:
+            log(f"Model response: {part.text}")
+        elif part.inline_data is not None:
+            # inline_data.data is already bytes, not base64
+            image_data = part.inline_data.data
+            if isinstance(image_data, str):
+                # If it's a string, it might be base64
+                import base64
+                image_data = base64.b64decode(image_data)
+
+            write_png(image_data, output_path)
+            image_saved = True
+
+    if not image_saved:
+        raise GenerationError("No image was generated in the response.")
+    return output_path.resolve()
+
+
+def run_in_daemon_thread(func, **kwargs) -> asyncio.Future:
+    """Run a blocking call on a daemon thread and return a future for its result.
+
+    Unlike asyncio.to_thread, a call abandoned after a timeout does not hold up
+    asyncio.run or interpreter exit.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def settle(result=None, error=None):
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def target():
+        try:
+            result = func(**kwargs)
+        except BaseException as e:
+            outcome = {"error": e}
+        else:
+            outcome = {"result": result}
+        with contextlib.suppress(RuntimeError):  # the loop already closed
+            loop.call_soon_threadsafe(lambda: settle(**outcome))
+
+    threading.Thread(target=target, daemon=True).start()
+    return future
+
+
+async def call_model(client, contents, config, timeout: float | None = None):
+    """Await one generate_content call, cancelling it after `timeout` seconds.
+
+    Uses the SDK's native async client (client.aio) when present; otherwise the
+    blocking call runs on a daemon thread. A timed-out thread call is abandoned
+    rather than interrupted, since blocking calls cannot be cancelled.
+    """
+    aio = getattr(client, "aio", None)
+    if aio is not None:
+        call = aio.models.generate_content(model=MODEL, contents=contents, config=config)
+    else:
+        call = run_in_daemon_thread(client.models.generate_content, model=MODEL, contents=contents, config=config)
+    try:
+        return await asyncio.wait_for(call, timeout)
+    except asyncio.TimeoutError as e:
+        raise GenerationError(f"Timed out after {timeout:g}s waiting for the model.") from e
+
+
+async def generate_async(
+    client,
+    prompt: str,
+    filename: str,
+    input_paths: list[str] | None = None,
+    resolution: str = "1K",
+    log=print,
+    limit: asyncio.Semaphore | None = None,
+    timeout: float | None = None,
+) -> Path:
+    """Generate (or edit) one image; `limit` caps how many run at once across callers."""
+    async with limit or contextlib.nullcontext():
+        # Image decoding and PNG encoding are CPU/disk work; keep them off the event loop.
+        contents, config = await asyncio.to_thread(build_request, prompt, input_paths, resolution, log)
+        response = await call_model(client, contents, config, timeout)
+        return await asyncio.to_thread(save_response, response, filename, log)
+
+
+def load_jobs(path: str, default_resolution: str) -> list[dict]:
+    """Read a JSONL batch file: one {"prompt", "filename", "input_images"?, "resolution"?} object per line."""
+    jobs = []
+    handle = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    with handle:
+        for lineno, line in enumerate(handle, start=1):
+            if not line.strip():
+                continue
+            try:
+                job = json.loads(line)
+            except ValueError as e:
+                raise GenerationError(f"{path}:{lineno}: invalid JSON: {e}") from e
+            if not isinstance(job, dict) or not job.get("prompt") or not job.get("filename"):
+                raise GenerationError(f"{path}:{lineno}: each job needs \"prompt\" and \"filename\"")
+            resolution = job.get("resolution", default_resolution)
+            if resolution not in RESOLUTIONS:
+                raise GenerationError(f"{path}:{lineno}: resolution must be one of {', '.join(RESOLUTIONS)}")
+            input_images = job.get("input_images") or []
+            if isinstance(input_images, str):
+                input_images = [input_images]
+            jobs.append({
+                "prompt": job["prompt"],
+                "filename": job["filename"],
+                "input_paths": input_images,
+                "resolution": resolution,
+            })
+    return jobs
+
+
+async def run_batch(client, jobs: list[dict], workers: int, timeout: float | None = None) -> list[dict]:
+    """Run jobs on a shared client with up to `workers` in flight; returns per-job status in job order."""
+    total = len(jobs)
+    limit = asyncio.Semaphore(max(1, workers))
+    lock = threading.Lock()
+
+    def log_for(label):
+        # Input loading and saving log from executor threads.
+        def log(message):
+            with lock:
+                print(f"{label} {message}", flush=True)
+        return log
+
+    async def run(number, job):
+        label = f"[{number}/{total}]"
+        start = time.monotonic()
+        try:
+            path = await generate_async(client, log=log_for(label), limit=limit, timeout=timeout, **job)
+        except Exception as e:
+            status = {"filename": job["filename"], "status": "error", "error": str(e)}
+            log_for(label)(f"FAILED {job['filename']}: {e}")
+        else:
+            status = {"filename": job["filename"], "status": "ok", "path": str(path)}
+            # OpenClaw parses MEDIA tokens and will attach the file on supported providers.
+            log_for(label)(f"saved {path}\nMEDIA: {path}")
+        status["seconds"] = round(time.monotonic() - start, 2)
+        return status
+
+    # One task per job; on Ctrl-C asyncio.run cancels them all, including in-flight requests.
+    return await asyncio.gather(*(run(number, job) for number, job in enumerate(jobs, start=1)))
+
+
+def main(argv: list[str] | None = None):
     parser = argparse.ArgumentParser(
         description="Generate images using Nano Banana Pro (Gemini 3 Pro Image)"
     )
     parser.add_argument(
         "--prompt", "-p",
-        required=True,
         help="Image description/prompt"
     )
     parser.add_argument(
         "--filename", "-f",
-        required=True,
         help="Output filename (e.g., sunset-mountains.png)"
     )
     parser.add_argument(
@@ -52,7 +379,7 @@ def main():
     )
     parser.add_argument(
         "--resolution", "-r",
-        choices=["1K", "2K", "4K"],
+        choices=RESOLUTIONS,
         default="1K",
         help="Output resolution: 1K (default), 2K, or 4K"
     )
@@ -60,8 +387,35 @@ def main():
         "--api-key", "-k",
         help="Gemini API key (overrides GEMINI_API_KEY env var)"
     )
+    parser.add_argument(
+        "--batch", "-b",
+        metavar="JOBS_JSONL",
+        help="Run many jobs with one client: a JSONL file ('-' for stdin) of "
+             '{"prompt", "filename", "input_images"?, "resolution"?} objects'
+    )
+    parser.add_argument(
+        "--workers", "-w",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"Concurrent jobs in --batch mode (default: {DEFAULT_WORKERS})"
+    )
+    parser.add_argument(
+        "--timeout", "-t",
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help=f"Seconds to wait for each generation before giving up (default: {DEFAULT_TIMEOUT:g}, 0 = no limit)"
+    )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if args.timeout < 0:
+        parser.error("--timeout must be >= 0")
+    if args.batch:
+        if args.prompt or args.filename or args.input_images:
+            parser.error("--batch takes prompts, filenames and input images from the jobs file")
+        if args.workers < 1:
+            parser.error("--workers must be >= 1")
+    elif not args.prompt or not args.filename:
+        parser.error("the following arguments are required: --prompt/-p, --filename/-f")
 
     # Get API key
     api_key = get_api_key(args.api_key)
@@ -72,114 +426,42 @@ def main():
         print("  2. Set GEMINI_API_KEY environment variable", file=sys.stderr)
         sys.exit(1)
 
+    if args.batch:
+        try:
+            jobs = load_jobs(args.batch, args.resolution)
+        except (OSError, GenerationError) as e:
+            print(f"Error reading batch file: {e}", file=sys.stderr)
+            sys.exit(1)
+
     # Import here after checking API key to avoid slow import on error
     from google import genai
-    from google.genai import types
-    from PIL import Image as PILImage
 
-    # Initialise client
+    # Initialise client (shared by every job in --batch mode)
     client = genai.Client(api_key=api_key)
 
-    # Set up output path
-    output_path = Path(args.filename)
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-
-    # Load input images if provided (up to 14 supported by Nano Banana Pro)
-    input_images = []
-    output_resolution = args.resolution
-    if args.input_images:
-        if len(args.input_images) > 14:
-            print(f"Error: Too many input images ({len(args.input_images)}). Maximum is 14.", file=sys.stderr)
+    if args.batch:
+        results = asyncio.run(run_batch(client, jobs, args.workers, args.timeout or None))
+        failed = [r for r in results if r["status"] != "ok"]
+        print(f"\nBatch done: {len(results) - len(failed)} saved, {len(failed)} failed.")
+        if failed:
             sys.exit(1)
-
-        max_input_dim = 0
-        for img_path in args.input_images:
-            try:
-                with PILImage.open(img_path) as img:
-                    copied = img.copy()
-                    width, height = copied.size
-                input_images.append(copied)
-                print(f"Loaded input image: {img_path}")
-
-                # Track largest dimension for auto-resolution
-                max_input_dim = max(max_input_dim, width, height)
-            except Exception as e:
-                print(f"Error loading input image '{img_path}': {e}", file=sys.stderr)
-                sys.exit(1)
-
-        # Auto-detect resolution from largest input if not explicitly set
-        if args.resolution == "1K" and max_input_dim > 0:  # Default value
-            if max_input_dim >= 3000:
-                output_resolution = "4K"
-            elif max_input_dim >= 1500:
-                output_resolution = "2K"
-            else:
-                output_resolution = "1K"
-            print(f"Auto-detected resolution: {output_resolution} (from max input dimension {max_input_dim})")
-
-    # Build contents (images first if editing, prompt only if generating)
-    if input_images:
-        contents = [*input_images, args.prompt]
-        img_count = len(input_images)
-        print(f"Processing {img_count} image{'s' if img_count > 1 else ''} with resolution {output_resolution}...")
-    else:
-        contents = args.prompt
-        print(f"Generating image with resolution {output_resolution}...")
+        return
 
     try:
-        response = client.models.generate_content(
-            model="gemini-3-pro-image-preview",
-            contents=contents,
-            config=types.GenerateContentConfig(
-                response_modalities=["TEXT", "IMAGE"],
-                image_config=types.ImageConfig(
-                    image_size=output_resolution
-                )
-            )
-        )
-
-        # Process response and convert to PNG
-        image_saved = False
-        for part in response.parts:
-            if part.text is not None:
-                print(f"Model response: {part.text}")
-            elif part.inline_data is not None:
-                # Convert inline data to PIL Image and save as PNG
-                from io import BytesIO
-
-                # inline_data.data is already bytes, not base64
-                image_data = part.inline_data.data
-                if isinstance(image_data, str):
-                    # If it's a string, it might be base64
-                    import base64
-                    image_data = base64.b64decode(image_data)
-
-                image = PILImage.open(BytesIO(image_data))
-
-                # Ensure RGB mode for PNG (convert RGBA to RGB with white background if needed)
-                if image.mode == 'RGBA':
-                    rgb_image = PILImage.new('RGB', image.size, (255, 255, 255))
-                    rgb_image.paste(image, mask=image.split()[3])
-                    rgb_image.save(str(output_path), 'PNG')
-                elif image.mode == 'RGB':
-                    image.save(str(output_path), 'PNG')
-                else:
-                    image.convert('RGB').save(str(output_path), 'PNG')
-                image_saved = True
-
-        if image_saved:
-            full_path = output_path.resolve()
-            print(f"\nImage saved: {full_path}")
-            # OpenClaw parses MEDIA tokens and will attach the file on supported providers.
-            print(f"MEDIA: {full_path}")
-        else:
-            print("Error: No image was generated in the response.", file=sys.stderr)
-            sys.exit(1)
-
+        full_path = asyncio.run(generate_async(
+            client, args.prompt, args.filename, args.input_images, args.resolution, timeout=args.timeout or None
+        ))
     except Exception as e:
-        print(f"Error generating image: {e}", file=sys.stderr)
+        if isinstance(e, GenerationError):
+            print(f"Error: {e}", file=sys.stderr)
+        else:
+            print(f"Error generating image: {e}", file=sys.stderr)
         sys.exit(1)
 
+    print(f"\nImage saved: {full_path}")
+    # OpenClaw parses MEDIA tokens and will attach the file on supported providers.
+    print(f"MEDIA: {full_path}")
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,263 @@
+"""Tests for generate_image.py: batch parsing, job handling and image pre/post-processing."""
+
+import asyncio
+import json
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from generate_image import (
+    RESOLUTION_EDGES,
+    GenerationError,
+    build_request,
+    call_model,
+    encode_input,
+    load_jobs,
+    main,
+    probe_size,
+    run_batch,
+    write_png,
+)
+
+
+def png_bytes(mode: str, size=(64, 48), color=(10, 20, 30, 128)) -> bytes:
+    image_module = pytest.importorskip("PIL.Image")
+    buffer = BytesIO()
+    image_module.new(mode, size, color[: len(mode)]).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def write_jobs(directory: Path, jobs: list) -> Path:
+    path = directory / "jobs.jsonl"
+    path.write_text("\n".join(job if isinstance(job, str) else json.dumps(job) for job in jobs) + "\n")
+    return path
+
+
+def test_main_parses_batch_without_prompt_or_filename(monkeypatch, capsys):
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        jobs = write_jobs(Path(tmpdir), [{"prompt": "a", "filename": "a.png"}])
+        # Parsing succeeds; the run then stops at the missing API key.
+        with pytest.raises(SystemExit) as exc:
+            main(["--batch", str(jobs), "--workers", "2", "--timeout", "30"])
+        assert exc.value.code == 1
+        assert "No API key provided" in capsys.readouterr().err
+
+        with pytest.raises(SystemExit) as exc:
+            main(["--batch", str(jobs), "--prompt", "x"])
+        assert exc.value.code == 2
+
+        with pytest.raises(SystemExit) as exc:
+            main(["--batch", str(jobs), "--timeout", "-1"])
+        assert exc.value.code == 2
+
+
+def test_main_requires_prompt_and_filename_without_batch(capsys):
+    with pytest.raises(SystemExit) as exc:
+        main(["--prompt", "x"])
+    assert exc.value.code == 2
+    assert "--filename" in capsys.readouterr().err
+
+
+def test_load_jobs_validates_lines():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        directory = Path(tmpdir)
+        path = write_jobs(directory, [
+            {"prompt": "a", "filename": "a.png"},
+            "",
+            {"prompt": "b", "filename": "b.png", "input_images": "in.png", "resolution": "4K"},
+        ])
+        assert load_jobs(str(path), "2K") == [
+            {"prompt": "a", "filename": "a.png", "input_paths": [], "resolution": "2K"},
+            {"prompt": "b", "filename": "b.png", "input_paths": ["in.png"], "resolution": "4K"},
+        ]
+
+        for bad, message in [
+            ("{not json", "invalid JSON"),
+            ({"prompt": "a"}, '"prompt" and "filename"'),
+            ({"prompt": "a", "filename": "a.png", "resolution": "8K"}, "resolution must be one of"),
+        ]:
+            path = write_jobs(directory, [{"prompt": "ok", "filename": "ok.png"}, bad])
+            with pytest.raises(GenerationError, match=message) as exc:
+                load_jobs(str(path), "1K")
+            assert ":2:" in str(exc.value)
+
+
+def fake_models(image: bytes):
+    calls = []
+
+    async def generate_content(model, contents, config):
+        calls.append(contents)
+        # Earlier jobs finish last.
+        await asyncio.sleep(0.01 * (4 - len(calls)))
+        if contents == "broken":
+            return SimpleNamespace(parts=[SimpleNamespace(text="no image today", inline_data=None)])
+        return SimpleNamespace(parts=[SimpleNamespace(text=None, inline_data=SimpleNamespace(data=image))])
+
+    return SimpleNamespace(generate_content=generate_content)
+
+
+def test_run_batch_isolates_failures_and_keeps_job_order(capsys):
+    pytest.importorskip("google.genai")
+    image = png_bytes("RGB")
+    client = SimpleNamespace(aio=SimpleNamespace(models=fake_models(image)))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        out = Path(tmpdir)
+        jobs = [
+            {"prompt": prompt, "filename": str(out / f"{prompt}.png"), "input_paths": [], "resolution": "1K"}
+            for prompt in ["first", "broken", "third"]
+        ]
+        results = asyncio.run(run_batch(client, jobs, workers=3))
+
+        assert [r["filename"] for r in results] == [job["filename"] for job in jobs]
+        assert [r["status"] for r in results] == ["ok", "error", "ok"]
+        assert results[1]["error"] == "No image was generated in the response."
+        assert (out / "first.png").read_bytes() == image
+        assert (out / "third.png").exists()
+        assert not (out / "broken.png").exists()
+
+    output = capsys.readouterr().out
+    assert f"MEDIA: {results[0]['path']}" in output
+    assert f"[2/3] FAILED {jobs[1]['filename']}" in output
+
+
+def test_call_model_falls_back_to_blocking_client():
+    def generate_content(model, contents, config):
+        return f"{model}:{contents}"
+
+    client = SimpleNamespace(models=SimpleNamespace(generate_content=generate_content))
+    assert asyncio.run(call_model(client, "hi", None, timeout=5)).endswith(":hi")
+
+
+def test_call_model_times_out_blocking_fallback():
+    def generate_content(model, contents, config):
+        time.sleep(5)
+
+    client = SimpleNamespace(models=SimpleNamespace(generate_content=generate_content))
+    start = time.monotonic()
+    with pytest.raises(GenerationError, match="Timed out after 0.05s"):
+        asyncio.run(call_model(client, "hi", None, timeout=0.05))
+    # asyncio.run returns without waiting for the abandoned call.
+    assert time.monotonic() - start < 2
+
+
+@pytest.mark.parametrize("resolution", ["1K", "2K"])
+def test_encode_input_downscales_to_resolution_edge(resolution):
+    image_module = pytest.importorskip("PIL.Image")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        directory = Path(tmpdir)
+        image_module.new("RGB", (3000, 1500), (1, 2, 3)).save(directory / "wide.jpg")
+        image_module.new("RGBA", (4200, 400), (1, 2, 3, 4)).save(directory / "banner.png")
+
+        data, mime_type, size = encode_input(str(directory / "wide.jpg"), RESOLUTION_EDGES[resolution])
+        assert mime_type == "image/jpeg"
+        assert size == (RESOLUTION_EDGES[resolution], RESOLUTION_EDGES[resolution] // 2)
+        with image_module.open(BytesIO(data)) as encoded:
+            assert encoded.size == size
+
+        data, mime_type, size = encode_input(str(directory / "banner.png"), RESOLUTION_EDGES[resolution])
+        assert mime_type == "image/webp"
+        assert max(size) == RESOLUTION_EDGES[resolution]
+
+        with pytest.raises(GenerationError, match="missing.png"):
+            encode_input(str(directory / "missing.png"), RESOLUTION_EDGES[resolution])
+
+
+def test_encode_input_sends_in_bounds_inputs_unchanged():
+    image_module = pytest.importorskip("PIL.Image")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        directory = Path(tmpdir)
+        image_module.effect_noise((800, 600), 64).convert("RGB").save(directory / "photo.jpg", quality=75)
+        image_module.new("RGBA", (500, 400), (1, 2, 3, 4)).save(directory / "shot.png")
+        image_module.new("RGB", (300, 200), (1, 2, 3)).save(directory / "old.bmp")
+        rotated = image_module.new("RGB", (300, 200), (1, 2, 3))
+        exif = rotated.getexif()
+        exif[0x0112] = 6  # rotate 90 degrees on display
+        rotated.save(directory / "rotated.jpg", exif=exif)
+
+        for name, mime_type in [("photo.jpg", "image/jpeg"), ("shot.png", "image/png")]:
+            path = directory / name
+            data, sent_mime_type, size = encode_input(str(path), RESOLUTION_EDGES["1K"])
+            assert data == path.read_bytes()
+            assert sent_mime_type == mime_type
+            with image_module.open(path) as original:
+                assert size == original.size
+
+        # Formats the API doesn't take, and sideways EXIF, are still re-encoded.
+        data, mime_type, size = encode_input(str(directory / "old.bmp"), RESOLUTION_EDGES["1K"])
+        assert (mime_type, size) == ("image/jpeg", (300, 200))
+        data, mime_type, size = encode_input(str(directory / "rotated.jpg"), RESOLUTION_EDGES["1K"])
+        assert (mime_type, size) == ("image/jpeg", (200, 300))
+
+
+def test_encode_input_rotates_then_downscales_sideways_jpeg():
+    image_module = pytest.importorskip("PIL.Image")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "sideways.jpg"
+        image = image_module.new("RGB", (3000, 1500), (1, 2, 3))
+        exif = image.getexif()
+        exif[0x0112] = 8  # rotate 270 degrees on display
+        image.save(path, exif=exif)
+
+        data, mime_type, size = encode_input(str(path), RESOLUTION_EDGES["1K"])
+
+    assert (mime_type, size) == ("image/jpeg", (512, 1024))
+    with image_module.open(BytesIO(data)) as encoded:
+        assert encoded.size == size
+        assert encoded.getexif().get(0x0112, 1) == 1
+
+
+def test_probe_size_reads_header_only():
+    image_module = pytest.importorskip("PIL.Image")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "big.jpg"
+        image_module.new("RGB", (3000, 1500), (1, 2, 3)).save(path)
+        # A truncated file still has a readable header.
+        path.write_bytes(path.read_bytes()[:2048])
+
+        assert probe_size(str(path)) == (3000, 1500)
+        with pytest.raises(GenerationError, match="missing.png"):
+            probe_size(str(path.with_name("missing.png")))
+
+
+def test_build_request_uploads_encoded_parts():
+    image_module = pytest.importorskip("PIL.Image")
+    pytest.importorskip("google.genai")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "big.png"
+        image_module.new("RGB", (1800, 900), (1, 2, 3)).save(path)
+
+        contents, config = build_request("edit", [str(path)], log=lambda _: None)
+
+        part, prompt = contents
+        assert prompt == "edit"
+        # Auto-resolution picks 2K, which the input already fits.
+        assert config.image_config.image_size == "2K"
+        assert part.inline_data.mime_type == "image/png"
+        assert part.inline_data.data == path.read_bytes()
+
+    with pytest.raises(GenerationError, match="missing.png"):
+        build_request("edit", [str(path.with_name("missing.png"))], log=lambda _: None)
+
+
+def test_write_png_keeps_rgb_png_bytes():
+    image = png_bytes("RGB")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "out.png"
+        write_png(image, path)
+        assert path.read_bytes() == image
+        assert [p.name for p in Path(tmpdir).iterdir()] == ["out.png"]
+
+
+def test_write_png_flattens_rgba_onto_white():
+    image_module = pytest.importorskip("PIL.Image")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "out.png"
+        write_png(png_bytes("RGBA", color=(0, 0, 0, 0)), path)
+        with image_module.open(path) as saved:
+            assert saved.format == "PNG"
+            assert saved.mode == "RGB"
+            assert saved.getpixel((0, 0)) == (255, 255, 255)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Benchmark gen.py against the offline mock Images API.
+
+Each concurrency setting runs gen.py in its own child process, which reports
+its own peak RSS; the mock server runs in this process.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import gen
+from mock_images_api import MODES, MockImagesAPI
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[rank]
+
+
+def run_child(base_url: str, images: int, concurrency: int, result_path: str) -> None:
+    """Run gen.main in this process, timing every API attempt; write stats to result_path."""
+    latencies: list[float] = []
+    lock = threading.Lock()
+    request_images = gen.request_images
+
+    def timed_request_images(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return request_images(*args, **kwargs)
+        finally:
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    gen.request_images = timed_request_images
+    with tempfile.TemporaryDirectory() as tmpdir:
+        prompts = os.path.join(tmpdir, "prompts.txt")
+        with open(prompts, "w", encoding="utf-8") as handle:
+            # Distinct prompts, so every image is its own request.
+            handle.writelines(f"benchmark prompt {i}\n" for i in range(images))
+        argv = [
+            "--prompts-file", prompts,
+            "--out-dir", os.path.join(tmpdir, "out"),
+            "--base-url", base_url,
+            "--concurrency", str(concurrency),
+            "--max-retries", "20",
+            "--no-thumbnails",
+        ]
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            code = gen.main(argv)
+        elapsed = time.perf_counter() - start
+    if code != 0:
+        raise SystemExit(code)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with open(result_path, "w", encoding="utf-8") as handle:
+        json.dump({
+            "seconds": elapsed,
+            "latencies": latencies,
+            # macOS reports peak RSS in bytes, Linux in KiB.
+            "peakRSSBytes": peak if sys.platform == "darwin" else peak * 1024,
+        }, handle)
+
+
+def bench(api: MockImagesAPI, images: int, concurrency: int, repeat: int) -> dict:
+    best: dict | None = None
+    for _ in range(repeat):
+        with tempfile.NamedTemporaryFile(suffix=".json") as result:
+            cmd = [
+                sys.executable, __file__,
+                "--child", api.base_url,
+                "--images", str(images),
+                "--concurrency", str(concurrency),
+                "--result", result.name,
+            ]
+            proc = subprocess.run(
+                cmd,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                env={**os.environ, "OPENAI_API_KEY": "mock"},
+            )
+            if proc.returncode != 0:
+                message = proc.stderr.decode("utf-8", errors="replace").strip()
+                raise RuntimeError(f"{' '.join(cmd)} failed ({proc.returncode}): {message}")
+            with open(result.name, encoding="utf-8") as handle:
+                stats = json.load(handle)
+        run = {
+            "concurrency": concurrency,
+            "images": images,
+            "seconds": stats["seconds"],
+            "imagesPerSecond": images / stats["seconds"] if stats["seconds"] else 0.0,
+            "p50Seconds": percentile(stats["latencies"], 50),
+            "p99Seconds": percentile(stats["latencies"], 99),
+            "requests": len(stats["latencies"]),
+            "peakRSSBytes": stats["peakRSSBytes"],
+        }
+        if best is None or run["seconds"] < best["seconds"]:
+            best = run
+    assert best is not None
+    return best
+
+
+def render_text(results: list[dict]) -> str:
+    lines = [f"{'concurrency':>11} {'images/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'requests':>8} {'peak MiB':>9}"]
+    for result in results:
+        lines.append(
+            f"{result['concurrency']:>11} {result['imagesPerSecond']:>9.1f}"
+            f" {result['p50Seconds'] * 1000:>8.1f} {result['p99Seconds'] * 1000:>8.1f}"
+            f" {result['requests']:>8} {result['peakRSSBytes'] / (1 << 20):>9.1f}"
+        )
+    return "\n".join(lines)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Benchmark gen.py against a local mock Images API.")
+    ap.add_argument("--images", type=int, default=64, help="Images per run (default: 64).")
+    ap.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency settings (default: 1,4,16).")
+    ap.add_argument("--latency", type=float, default=0.2, help="Mock seconds per request (default: 0.2).")
+    ap.add_argument("--jitter", type=float, default=0.05, help="Mock +/- latency jitter (default: 0.05).")
+    ap.add_argument("--rate-limit", type=float, default=0.0, help="Fraction of requests the mock answers with 429.")
+    ap.add_argument("--mode", choices=MODES, default="b64", help="Mock response mode (default: b64).")
+    ap.add_argument("--image-side", type=int, default=1024, help="Mock PNG width/height (default: 1024, ~3 MiB).")
+    ap.add_argument("--repeat", type=int, default=1, help="Best of N runs per setting.")
+    ap.add_argument("--format", choices=["text", "json"], default="text")
+    ap.add_argument("--child", metavar="BASE_URL", help=argparse.SUPPRESS)
+    ap.add_argument("--result", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        run_child(args.child, args.images, int(args.concurrency), args.result)
+        return 0
+
+    try:
+        settings = [int(value) for value in args.concurrency.split(",") if value.strip()]
+    except ValueError:
+        ap.error("--concurrency must be comma-separated integers")
+    if args.images < 1 or args.repeat < 1 or not settings or min(settings) < 1:
+        ap.error("--images, --repeat and --concurrency must be >= 1")
+
+    results = []
+    with MockImagesAPI(
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_limit=args.rate_limit,
+        mode=args.mode,
+        image_side=args.image_side,
+    ) as api:
+        for concurrency in settings:
+            results.append(bench(api, args.images, concurrency, args.repeat))
+        rate_limited = api.rate_limited
+
+    if args.format == "json":
+        print(json.dumps({"rateLimited": rate_limited, "results": results}, indent=2))
+    else:
+        print(render_text(results))
+        if rate_limited:
+            print(f"Injected 429s: {rate_limited}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
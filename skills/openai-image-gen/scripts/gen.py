@@ -1,16 +1,43 @@
 #!/usr/bin/env python3
 import argparse
 import base64
+import binascii
 import datetime as dt
+import hashlib
+import http.client
 import json
 import os
 import random
 import re
+import shutil
+import sqlite3
+import ssl
 import sys
-import urllib.error
+import tempfile
+import threading
+import time
 import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
 from html import escape as html_escape
 from pathlib import Path
+from typing import Callable
+from urllib.parse import urljoin, urlsplit
+
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+# Transient network failures; anything else (a full disk while spooling, a failed
+# certificate check) is raised as-is rather than retried.
+RETRYABLE_ERRORS = (
+    ConnectionError,
+    TimeoutError,
+    http.client.RemoteDisconnected,
+    http.client.IncompleteRead,
+)
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+STREAM_CHUNK_SIZE = 1 << 16
+B64_MARKER = b'"b64_json"'
+B64_VALUE_START = re.compile(rb'\s*:\s*"')
 
 
 def slugify(text: str) -> str:
@@ -75,8 +102,135 @@ def get_model_defaults(model: str) -> tuple[str, str]:
         return ("1024x1024", "high")
 
 
-def request_images(
-    api_key: str,
+# Images per request ("n") each model accepts; anything else takes up to 10.
+MAX_IMAGES_PER_REQUEST = {"dall-e-3": 1}
+
+
+def max_images_per_request(model: str) -> int:
+    return MAX_IMAGES_PER_REQUEST.get(model, 10)
+
+
+class HTTPPool:
+    """Keep-alive http.client connections shared by every request in a batch.
+
+    Idle connections are kept per (scheme, host, port) and handed to one thread
+    at a time, so each worker reuses an open TCP+TLS session instead of paying
+    a new handshake per image. Honours http(s)_proxy like urllib does.
+    """
+
+    REDIRECTS = {301, 302, 303, 307, 308}
+
+    def __init__(self, timeout: float = 300, max_idle_per_host: int = 16) -> None:
+        self.timeout = timeout
+        self.max_idle_per_host = max_idle_per_host
+        self.idle: dict[tuple, list[http.client.HTTPConnection]] = {}
+        self.lock = threading.Lock()
+        self.ssl_context = ssl.create_default_context()
+        self.proxies = urllib.request.getproxies()
+
+    def _connect(self, scheme: str, host: str, port: int | None) -> http.client.HTTPConnection:
+        proxy = None if urllib.request.proxy_bypass(host) else self.proxies.get(scheme)
+        if proxy:
+            proxy_parts = urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+            if scheme == "https":
+                conn = http.client.HTTPSConnection(
+                    proxy_parts.hostname,
+                    proxy_parts.port,
+                    timeout=self.timeout,
+                    context=self.ssl_context,
+                )
+                conn.set_tunnel(host, port)
+                return conn
+            return http.client.HTTPConnection(
+                proxy_parts.hostname, proxy_parts.port, timeout=self.timeout
+            )
+        if scheme == "https":
+            return http.client.HTTPSConnection(
+                host, port, timeout=self.timeout, context=self.ssl_context
+            )
+        return http.client.HTTPConnection(host, port, timeout=self.timeout)
+
+    def _checkout(self, key: tuple) -> tuple[http.client.HTTPConnection, bool]:
+        with self.lock:
+            idle = self.idle.get(key)
+            if idle:
+                return idle.pop(), True
+        return self._connect(*key), False
+
+    def _release(
+        self, key: tuple, conn: http.client.HTTPConnection, resp: http.client.HTTPResponse
+    ) -> None:
+        # Only a fully read response leaves the connection ready for the next request.
+        if resp.isclosed() and not resp.will_close:
+            with self.lock:
+                idle = self.idle.setdefault(key, [])
+                if len(idle) < self.max_idle_per_host:
+                    idle.append(conn)
+                    return
+        conn.close()
+
+    def _send(
+        self, key: tuple, method: str, target: str, body: bytes | None, headers: dict
+    ) -> tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+        while True:
+            conn, reused = self._checkout(key)
+            try:
+                conn.request(method, target, body=body, headers=headers)
+                return conn, conn.getresponse()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                conn.close()
+                # The server dropped an idle keep-alive connection; retry on a fresh one.
+                if not reused:
+                    raise
+            except BaseException:
+                conn.close()
+                raise
+
+    @contextmanager
+    def open(
+        self, method: str, url: str, body: bytes | None = None, headers: dict | None = None
+    ):
+        """Yield an http.client.HTTPResponse, following up to 5 redirects."""
+        headers = dict(headers or {})
+        for _ in range(6):
+            parts = urlsplit(url)
+            if parts.scheme not in ("http", "https") or not parts.hostname:
+                raise ValueError(f"Unsupported URL: {url}")
+            key = (parts.scheme, parts.hostname, parts.port)
+            target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+            if (
+                parts.scheme == "http"
+                and self.proxies.get("http")
+                and not urllib.request.proxy_bypass(parts.hostname)
+            ):
+                # Plain-HTTP proxies take the absolute URL as the request target.
+                target = url
+            conn, resp = self._send(key, method, target, body, headers)
+            location = resp.getheader("Location")
+            if resp.status in self.REDIRECTS and location:
+                resp.read()
+                self._release(key, conn, resp)
+                url = urljoin(url, location)
+                if resp.status == 303 or (resp.status in (301, 302) and method == "POST"):
+                    method, body = "GET", None
+                    headers.pop("Content-Type", None)
+                continue
+            try:
+                yield resp
+            finally:
+                self._release(key, conn, resp)
+            return
+        raise http.client.HTTPException(f"Too many redirects for {url}")
+
+    def close(self) -> None:
+        with self.lock:
+            idle, self.idle = self.idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+
+def build_request_args(
     prompt: str,
     model: str,
     size: str,
@@ -84,13 +238,13 @@ def request_images(
     background: str = "",
     output_format: str = "",
     style: str = "",
+    n: int = 1,
 ) -> dict:
-    url = "https://api.openai.com/v1/images/generations"
     args = {
         "model": model,
         "prompt": prompt,
         "size": size,
-        "n": 1,
+        "n": n,
     }
 
     # Quality parameter - dall-e-2 doesn't accept this parameter
@@ -109,61 +263,803 @@ def request_images(
     if model == "dall-e-3" and style:
         args["style"] = style
 
+    return args
+
+
+def request_images(
+    api_key: str,
+    prompt: str,
+    model: str,
+    size: str,
+    quality: str,
+    background: str = "",
+    output_format: str = "",
+    style: str = "",
+    pool: HTTPPool | None = None,
+    spool_dir: Path | None = None,
+    n: int = 1,
+    base_url: str = "",
+) -> dict:
+    """POST an image generation request for `n` images to `base_url` (default: OpenAI).
+
+    With `spool_dir`, b64_json images are decoded to temp files there while the
+    response streams in; each data item then carries "b64_file" instead.
+    """
+    url = f"{(base_url or DEFAULT_BASE_URL).rstrip('/')}/images/generations"
+    args = build_request_args(prompt, model, size, quality, background, output_format, style, n)
     body = json.dumps(args).encode("utf-8")
-    req = urllib.request.Request(
-        url,
-        method="POST",
-        headers={
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        },
-        data=body,
-    )
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+    }
+    pool = pool or HTTPPool()
     try:
-        with urllib.request.urlopen(req, timeout=300) as resp:
-            return json.loads(resp.read().decode("utf-8"))
-    except urllib.error.HTTPError as e:
-        payload = e.read().decode("utf-8", errors="replace")
-        raise RuntimeError(f"OpenAI Images API failed ({e.code}): {payload}") from e
+        with pool.open("POST", url, body=body, headers=headers) as resp:
+            if resp.status < 400 and spool_dir is not None:
+                return read_images_response(resp, spool_dir)
+            raw = resp.read()
+            if resp.status >= 400:
+                payload = raw.decode("utf-8", errors="replace")
+                raise ImagesAPIError(
+                    f"OpenAI Images API failed ({resp.status}): {payload}",
+                    status=resp.status,
+                    retry_after=parse_retry_after(resp.headers),
+                    retryable=(
+                        resp.status in RETRYABLE_STATUSES and "insufficient_quota" not in payload
+                    ),
+                )
+            return json.loads(raw.decode("utf-8"))
+    except RETRYABLE_ERRORS as e:
+        raise ImagesAPIError(f"OpenAI Images API request failed: {e}", retryable=True) from e
 
 
-def write_gallery(out_dir: Path, items: list[dict]) -> None:
-    thumbs = "\n".join(
-        [
-            f"""
-<figure>
-  <a href="{html_escape(it["file"], quote=True)}"><img src="{html_escape(it["file"], quote=True)}" loading="lazy" /></a>
-  <figcaption>{html_escape(it["prompt"])}</figcaption>
-</figure>
-""".strip()
-            for it in items
-        ]
-    )
-    html = f"""<!doctype html>
+def temp_file(directory: Path):
+    """Open a hidden temp file in `directory` for an atomic os.replace later."""
+    handle = tempfile.NamedTemporaryFile(dir=directory, prefix=".", suffix=".part", delete=False)
+    return handle, Path(handle.name)
+
+
+def read_images_response(resp, spool_dir: Path) -> dict:
+    """Parse an Images API response, decoding every b64_json value straight to disk.
+
+    Only the JSON around the image strings is buffered; each base64 value is
+    decoded chunk by chunk into a temp file in `spool_dir` and replaced by a
+    "b64_file" path on its data item.
+    """
+    skeleton = bytearray()
+    files: list[Path] = []
+    buf = b""
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buf, eof
+        chunk = b"" if eof else resp.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            eof = True
+            return False
+        buf += chunk
+        return True
+
+    try:
+        while True:
+            idx = buf.find(B64_MARKER)
+            if idx < 0:
+                # Keep a possible partial marker at the end of the buffer.
+                keep = len(B64_MARKER) - 1
+                cut = max(0, len(buf) - keep)
+                skeleton += buf[:cut]
+                buf = buf[cut:]
+                if not fill():
+                    skeleton += buf
+                    break
+                continue
+            end = idx + len(B64_MARKER)
+            while len(buf) - end < 16 and fill():
+                pass
+            match = B64_VALUE_START.match(buf, end)
+            before = buf[idx - 1 : idx] if idx else skeleton[-1:]
+            if before == b"\\" or not match:
+                # An escaped quote inside another string, or a non-string value.
+                skeleton += buf[:end]
+                buf = buf[end:]
+                continue
+            skeleton += buf[: match.end()]
+            buf = buf[match.end() :]
+            handle, path = temp_file(spool_dir)
+            files.append(path)
+            with handle:
+                carry = b""
+                while True:
+                    close = buf.find(b'"')
+                    segment = buf if close < 0 else buf[:close]
+                    if close < 0 and segment.endswith(b"\\"):
+                        segment = segment[:-1]
+                    buf = buf[len(segment) :]
+                    data = carry + segment.replace(b"\\/", b"/").replace(b"\\n", b"").replace(b"\\r", b"")
+                    usable = len(data) - len(data) % 4
+                    handle.write(binascii.a2b_base64(data[:usable]))
+                    carry = data[usable:]
+                    if close >= 0:
+                        break
+                    if not fill():
+                        raise ValueError("Truncated b64_json value in Images API response")
+                if carry.strip():
+                    handle.write(binascii.a2b_base64(carry + b"=" * (-len(carry) % 4)))
+    except BaseException:
+        for path in files:
+            path.unlink(missing_ok=True)
+        raise
+
+    spooled = iter(files)
+    try:
+        res = json.loads(bytes(skeleton).decode("utf-8"))
+        for item in res.get("data") or []:
+            # Only string values were spooled; null or missing b64_json (URL items) stay as-is.
+            if isinstance(item, dict) and isinstance(item.get("b64_json"), str):
+                path = next(spooled, None)
+                if path is None:
+                    break
+                item.pop("b64_json")
+                item["b64_file"] = str(path)
+    finally:
+        # Anything left was spooled from outside data[] and has no item to go to.
+        for path in spooled:
+            path.unlink(missing_ok=True)
+    return res
+
+
+class ImagesAPIError(RuntimeError):
+    def __init__(
+        self,
+        message: str,
+        status: int | None = None,
+        retry_after: float | None = None,
+        retryable: bool = False,
+    ) -> None:
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.retryable = retryable
+
+
+def parse_duration(value: str) -> float | None:
+    """Parse OpenAI reset durations such as "20ms", "1s" or "6m0s"."""
+    matches = re.findall(r"(\d+(?:\.\d+)?)(ms|s|m|h)", value)
+    if not matches or "".join(num + unit for num, unit in matches) != value.strip():
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(num) * scale[unit] for num, unit in matches)
+
+
+def parse_retry_after(headers) -> float | None:
+    """Seconds to wait according to Retry-After or OpenAI rate-limit headers."""
+    if headers is None:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens"):
+        value = headers.get(name)
+        if value and parse_duration(value) is not None:
+            return parse_duration(value)
+    return None
+
+
+class TokenBucket:
+    """Thread-safe pacing: `rate` requests/second (0 = unpaced) plus shared cooldowns."""
+
+    def __init__(self, rate: float, capacity: float = 1.0) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def pause(self, seconds: float) -> None:
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                wait = self.paused_until - now
+                if wait <= 0:
+                    if self.rate <= 0:
+                        return
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RequestScheduler:
+    """Per-model token-bucket pacing with jittered exponential backoff on 429/5xx.
+
+    A 429 pauses every worker using that model for the server-provided delay,
+    so a batch backs off together instead of hammering the API.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 0,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ) -> None:
+        self.rate = requests_per_minute / 60
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.buckets: dict[str, TokenBucket] = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, model: str) -> TokenBucket:
+        with self.lock:
+            if model not in self.buckets:
+                self.buckets[model] = TokenBucket(self.rate)
+            return self.buckets[model]
+
+    def call(self, model: str, func):
+        bucket = self.bucket(model)
+        attempt = 0
+        while True:
+            bucket.acquire()
+            try:
+                return func()
+            except ImagesAPIError as e:
+                if not e.retryable or attempt >= self.max_retries:
+                    raise
+                # Full jitter keeps retrying workers from re-synchronising.
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+                if e.retry_after is not None:
+                    delay = max(delay, min(e.retry_after, self.max_delay))
+                if e.status == 429:
+                    bucket.pause(delay)
+                attempt += 1
+                status = e.status or "network error"
+                print(
+                    f"Retrying {model} after {status} in {delay:.1f}s "
+                    f"(attempt {attempt}/{self.max_retries})",
+                    file=sys.stderr,
+                    flush=True,
+                )
+                time.sleep(delay)
+
+
+def save_image(res: dict, filepath: Path, pool: HTTPPool | None = None, index: int = 0) -> None:
+    """Save image `index` of an Images API response to `filepath`."""
+    items = res.get("data") or [{}]
+    data = items[index] if index < len(items) else {}
+    image_file = data.get("b64_file")
+    image_b64 = data.get("b64_json")
+    image_url = data.get("url")
+    if not image_file and not image_b64 and not image_url:
+        raise RuntimeError(f"Unexpected response: {json.dumps(res)[:400]}")
+
+    # Every path writes to a temp file first so a crash never leaves a partial image.
+    if image_file:
+        os.replace(image_file, filepath)
+        return
+    handle, tmp_path = temp_file(filepath.parent)
+    try:
+        with handle:
+            if image_b64:
+                handle.write(base64.b64decode(image_b64))
+            else:
+                pool = pool or HTTPPool()
+                try:
+                    with pool.open("GET", image_url) as resp:
+                        if resp.status >= 400:
+                            raise RuntimeError(f"HTTP Error {resp.status}: {resp.reason}")
+                        shutil.copyfileobj(resp, handle, STREAM_CHUNK_SIZE)
+                except (OSError, ValueError, http.client.HTTPException, RuntimeError) as e:
+                    raise RuntimeError(f"Failed to download image from {image_url}: {e}") from e
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    digest TEXT PRIMARY KEY,
+    suffix TEXT NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    digest TEXT NOT NULL REFERENCES objects(digest),
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_used_at ON entries(used_at);
+"""
+
+
+def default_cache_dir() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+    return Path(base).expanduser() / "openai-image-gen"
+
+
+def link_or_copy(src: Path, dest: Path) -> None:
+    """Hardlink `src` to `dest` atomically, copying when links are unsupported or cross-device."""
+    handle, tmp_path = temp_file(dest.parent)
+    handle.close()
+    tmp_path.unlink()
+    try:
+        try:
+            os.link(src, tmp_path)
+        except OSError:
+            shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dest)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+class ImageCache:
+    """Content-addressed store of generated images, keyed by request args.
+
+    Images live once per sha256 under objects/; an SQLite index maps request
+    keys to digests. Least recently used entries are evicted once the stored
+    objects exceed `max_bytes`.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        (directory / "objects").mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(directory / "index.sqlite", check_same_thread=False, timeout=30)
+        self._db.executescript(CACHE_SCHEMA)
+
+    @staticmethod
+    def key(args: dict, variant: int = 0, base_url: str = "") -> str:
+        """Hash the endpoint and full request args; `variant` tells repeats of one prompt apart."""
+        endpoint = (base_url or DEFAULT_BASE_URL).rstrip("/")
+        blob = json.dumps({"endpoint": endpoint, "args": args, "variant": variant}, sort_keys=True)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def object_path(self, digest: str, suffix: str) -> Path:
+        return self.directory / "objects" / digest[:2] / f"{digest}{suffix}"
+
+    def fetch(self, key: str, dest: Path) -> bool:
+        """Link a cached image for `key` to `dest`; returns False on a miss."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT o.digest, o.suffix FROM entries e JOIN objects o USING (digest) WHERE e.key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return False
+            path = self.object_path(*row)
+            try:
+                link_or_copy(path, dest)
+            except FileNotFoundError:
+                # Removed from disk behind our back; treat as a miss.
+                self._db.execute("DELETE FROM entries WHERE digest = ?", (row[0],))
+                self._db.execute("DELETE FROM objects WHERE digest = ?", (row[0],))
+                self._db.commit()
+                return False
+            self._db.execute("UPDATE entries SET used_at = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            return True
+
+    def store(self, key: str, src: Path) -> None:
+        digest = hashlib.sha256()
+        with src.open("rb") as handle:
+            for chunk in iter(lambda: handle.read(STREAM_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        name = digest.hexdigest()
+        path = self.object_path(name, src.suffix)
+        with self._lock:
+            if not path.exists():
+                path.parent.mkdir(exist_ok=True)
+                link_or_copy(src, path)
+            self._db.execute(
+                "INSERT OR IGNORE INTO objects (digest, suffix, size) VALUES (?, ?, ?)",
+                (name, src.suffix, path.stat().st_size),
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, digest, used_at) VALUES (?, ?, ?)",
+                (key, name, time.time()),
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self) -> None:
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+        while total > self.max_bytes:
+            row = self._db.execute("SELECT key, digest FROM entries ORDER BY used_at LIMIT 1").fetchone()
+            if row is None:
+                break
+            key, digest = row
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            if self._db.execute("SELECT 1 FROM entries WHERE digest = ?", (digest,)).fetchone():
+                continue
+            suffix, size = self._db.execute("SELECT suffix, size FROM objects WHERE digest = ?", (digest,)).fetchone()
+            self._db.execute("DELETE FROM objects WHERE digest = ?", (digest,))
+            self.object_path(digest, suffix).unlink(missing_ok=True)
+            total -= size
+
+    def close(self) -> None:
+        self._db.close()
+
+
+GALLERY_PAGE_SIZE = 200
+THUMB_SIZE = 384
+GALLERY_STYLE = """
+  :root { color-scheme: dark; }
+  body { margin: 24px; font: 14px/1.4 ui-sans-serif, system-ui; background: #0b0f14; color: #e8edf2; }
+  h1 { font-size: 18px; margin: 0 0 16px; }
+  nav { margin: 0 0 16px; display: flex; flex-wrap: wrap; gap: 8px; }
+  nav a, nav strong { padding: 2px 8px; border: 1px solid #1e2a36; border-radius: 8px; color: #9cd1ff; text-decoration: none; }
+  .grid { display: grid; grid-template-columns: repeat(auto-fill, minmax(240px, 1fr)); gap: 16px; }
+  figure { margin: 0; padding: 12px; border: 1px solid #1e2a36; border-radius: 14px; background: #0f1620; content-visibility: auto; contain-intrinsic-size: 240px 320px; }
+  img { width: 100%; height: auto; border-radius: 10px; display: block; }
+  figcaption { margin-top: 10px; color: #b7c2cc; }
+  code { color: #9cd1ff; }
+"""
+
+
+def import_pil():
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    return Image
+
+
+def make_thumbnail(image_module, src: Path, dest: Path, size: int = THUMB_SIZE) -> bool:
+    """Write a small WebP preview of `src`; returns False if it cannot be made."""
+    if not src.is_file():
+        return False
+    if dest.exists() and dest.stat().st_mtime >= src.stat().st_mtime:
+        return True
+    dest.parent.mkdir(exist_ok=True)
+    handle, tmp_path = temp_file(dest.parent)
+    try:
+        with handle, image_module.open(src) as image:
+            image.draft("RGB", (size, size))  # JPEG: decode at reduced scale
+            image.thumbnail((size, size))
+            image.save(handle, "WEBP", quality=80)
+        os.replace(tmp_path, dest)
+        return True
+    except (OSError, ValueError):
+        tmp_path.unlink(missing_ok=True)
+        return False
+
+
+def gallery_page_name(page: int) -> str:
+    return "index.html" if page == 1 else f"page-{page}.html"
+
+
+class Gallery:
+    """Paginated index.html gallery, updated page by page as images land.
+
+    Each image gets a WebP thumbnail under thumbs/ when Pillow is installed;
+    otherwise the page links the full image. Adding an image rewrites only its
+    own page (at most `page_size` figures), so cost per image stays flat.
+    """
+
+    def __init__(self, out_dir: Path, total: int, page_size: int = GALLERY_PAGE_SIZE, thumbnails: bool = True) -> None:
+        self.out_dir = out_dir
+        self.page_size = max(1, page_size)
+        self.pages = max(1, -(-total // self.page_size))
+        self.image_module = import_pil() if thumbnails else None
+        self.items: dict[int, dict] = {}
+        self.thumbs: dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def page_of(self, idx: int) -> int:
+        return (idx - 1) // self.page_size + 1
+
+    def add(self, idx: int, item: dict, write: bool = True) -> None:
+        thumb = ""
+        if self.image_module is not None:
+            name = f"thumbs/{Path(item['file']).stem}.webp"
+            if make_thumbnail(self.image_module, self.out_dir / item["file"], self.out_dir / name):
+                thumb = name
+        with self._lock:
+            self.items[idx] = item
+            if thumb:
+                self.thumbs[idx] = thumb
+            if write:
+                self.write_page(self.page_of(idx))
+
+    def write_all(self) -> None:
+        with self._lock:
+            for page in range(1, self.pages + 1):
+                self.write_page(page)
+
+    def write_page(self, page: int) -> None:
+        first = (page - 1) * self.page_size + 1
+        indices = [idx for idx in range(first, first + self.page_size) if idx in self.items]
+        figures = "\n".join(self.figure(idx) for idx in indices)
+        nav = ""
+        if self.pages > 1:
+            links = [
+                f"<strong>{p}</strong>" if p == page else f'<a href="{gallery_page_name(p)}">{p}</a>'
+                for p in range(1, self.pages + 1)
+            ]
+            nav = f"<nav>{' '.join(links)}</nav>"
+        html = f"""<!doctype html>
 <meta charset="utf-8" />
 <title>openai-image-gen</title>
-<style>
-  :root {{ color-scheme: dark; }}
-  body {{ margin: 24px; font: 14px/1.4 ui-sans-serif, system-ui; background: #0b0f14; color: #e8edf2; }}
-  h1 {{ font-size: 18px; margin: 0 0 16px; }}
-  .grid {{ display: grid; grid-template-columns: repeat(auto-fill, minmax(240px, 1fr)); gap: 16px; }}
-  figure {{ margin: 0; padding: 12px; border: 1px solid #1e2a36; border-radius: 14px; background: #0f1620; }}
-  img {{ width: 100%; height: auto; border-radius: 10px; display: block; }}
-  figcaption {{ margin-top: 10px; color: #b7c2cc; }}
-  code {{ color: #9cd1ff; }}
-</style>
+<style>{GALLERY_STYLE}</style>
 <h1>openai-image-gen</h1>
-<p>Output: <code>{html_escape(out_dir.as_posix())}</code></p>
+<p>Output: <code>{html_escape(self.out_dir.as_posix())}</code></p>
+{nav}
 <div class="grid">
-{thumbs}
+{figures}
 </div>
+{nav}
 """
-    (out_dir / "index.html").write_text(html, encoding="utf-8")
+        handle, tmp_path = temp_file(self.out_dir)
+        try:
+            with handle:
+                handle.write(html.encode("utf-8"))
+            os.replace(tmp_path, self.out_dir / gallery_page_name(page))
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    def figure(self, idx: int) -> str:
+        item = self.items[idx]
+        href = html_escape(item["file"], quote=True)
+        src = html_escape(self.thumbs.get(idx, item["file"]), quote=True)
+        return f"""
+<figure>
+  <a href="{href}"><img src="{src}" loading="lazy" decoding="async" /></a>
+  <figcaption>{html_escape(item["prompt"])}</figcaption>
+</figure>
+""".strip()
+
+
+def write_gallery(out_dir: Path, items: list[dict], page_size: int = GALLERY_PAGE_SIZE) -> None:
+    gallery = Gallery(out_dir, len(items), page_size)
+    for idx, item in enumerate(items, start=1):
+        gallery.add(idx, item, write=False)
+    gallery.write_all()
+
+
+MANIFEST_NAME = "manifest.jsonl"
+RUN_NAME = "run.json"
+
+
+class Manifest:
+    """Append-only JSONL log of finished images, one line per image as it lands."""
+
+    def __init__(self, out_dir: Path) -> None:
+        self.path = out_dir / MANIFEST_NAME
+        self._lock = threading.Lock()
+        self._handle = self.path.open("a", encoding="utf-8")
+        if self.path.stat().st_size:
+            with self.path.open("rb") as handle:
+                handle.seek(-1, os.SEEK_END)
+                if handle.read() != b"\n":
+                    self._handle.write("\n")  # close off a line torn by a crash
+
+    def record(self, idx: int, item: dict) -> None:
+        line = json.dumps({"idx": idx, **item}) + "\n"
+        with self._lock:
+            self._handle.write(line)
+            self._handle.flush()
+
+    def close(self) -> None:
+        self._handle.close()
+
+
+def load_manifest(out_dir: Path) -> dict[int, dict]:
+    """Return {idx: item} for manifest entries whose image is still on disk."""
+    done: dict[int, dict] = {}
+    path = out_dir / MANIFEST_NAME
+    if not path.exists():
+        return done
+    with path.open(encoding="utf-8") as handle:
+        for line in handle:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by a crash
+            idx = entry.pop("idx", None)
+            if isinstance(idx, int) and (out_dir / entry.get("file", "")).is_file():
+                done[idx] = entry
+    return done
+
+
+def read_prompts_file(path: str) -> list[str]:
+    """Read one prompt per non-blank line from `path` ("-" for stdin)."""
+    if path == "-":
+        return [line.strip() for line in sys.stdin if line.strip()]
+    with open(Path(path).expanduser(), encoding="utf-8") as handle:
+        return [line.strip() for line in handle if line.strip()]
+
+
+def discard_spooled(res: dict) -> None:
+    """Remove spooled b64 files that were never moved into place."""
+    for item in res.get("data") or []:
+        if isinstance(item, dict) and item.get("b64_file"):
+            Path(item["b64_file"]).unlink(missing_ok=True)
+
+
+def request_group(
+    jobs: list[tuple[int, int]],
+    prompt: str,
+    total: int,
+    out_dir: Path,
+    file_ext: str,
+    api_key: str,
+    model: str,
+    size: str,
+    quality: str,
+    background: str = "",
+    output_format: str = "",
+    style: str = "",
+    scheduler: RequestScheduler | None = None,
+    pool: HTTPPool | None = None,
+    cache: ImageCache | None = None,
+    manifest: Manifest | None = None,
+    gallery: Gallery | None = None,
+    base_url: str = "",
+) -> tuple[list[dict], Callable[..., None]]:
+    """Request one image per (idx, variant) job for `prompt` with a single n>1 request.
+
+    Returns the items and a `finish` callable for the save stage: it downloads
+    or moves each image into place, or with `discard=True` drops the response.
+    """
+    items = {idx: {"prompt": prompt, "file": f"{idx:03d}-{slugify(prompt)[:40]}.{file_ext}"} for idx, _ in jobs}
+    keys: dict[int, str] = {}
+    missing = []
+    for idx, variant in jobs:
+        if cache:
+            args = build_request_args(prompt, model, size, quality, background, output_format, style)
+            keys[idx] = cache.key(args, variant, base_url)
+            if cache.fetch(keys[idx], out_dir / items[idx]["file"]):
+                print(f"[{idx}/{total}] {prompt} (cached)", flush=True)
+                if manifest:
+                    manifest.record(idx, items[idx])
+                if gallery:
+                    gallery.add(idx, items[idx])
+                continue
+        missing.append(idx)
+    results = [items[idx] for idx, _ in jobs]
+    if not missing:
+        return results, lambda discard=False: None
+
+    label = f"{missing[0]}" if len(missing) == 1 else f"{missing[0]}+{len(missing) - 1}"
+    print(f"[{label}/{total}] {prompt}", flush=True)
+    scheduler = scheduler or RequestScheduler(max_retries=0)
+    res = scheduler.call(
+        model,
+        lambda: request_images(
+            api_key,
+            prompt,
+            model,
+            size,
+            quality,
+            background,
+            output_format,
+            style,
+            pool,
+            out_dir,
+            len(missing),
+            base_url=base_url,
+        ),
+    )
+
+    def finish(discard: bool = False) -> None:
+        try:
+            for index, idx in enumerate(missing):
+                if discard:
+                    break
+                save_image(res, out_dir / items[idx]["file"], pool, index)
+                if cache:
+                    cache.store(keys[idx], out_dir / items[idx]["file"])
+                if manifest:
+                    manifest.record(idx, items[idx])
+                if gallery:
+                    gallery.add(idx, items[idx])
+        finally:
+            discard_spooled(res)
+
+    return results, finish
+
+
+def group_prompts(
+    prompts: list[str], max_n: int, concurrency: int = 1, skip: set[int] | frozenset[int] = frozenset()
+) -> list[tuple[str, list[tuple[int, int]]]]:
+    """Split prompts into (prompt, [(idx, variant), ...]) request groups of at most `max_n` images.
+
+    Identical prompts share requests. Groups are kept small enough that every
+    worker gets one, so batching never leaves `concurrency` slots idle. Indices
+    in `skip` are left out without renumbering the rest.
+    """
+    by_prompt: dict[str, list[tuple[int, int]]] = {}
+    variants: dict[str, int] = {}
+    for idx, prompt in enumerate(prompts, start=1):
+        # Repeats of one prompt are distinct images, so each gets its own cache variant.
+        variant = variants.get(prompt, 0)
+        variants[prompt] = variant + 1
+        if idx not in skip:
+            by_prompt.setdefault(prompt, []).append((idx, variant))
+    groups = []
+    for prompt, jobs in by_prompt.items():
+        size = max(1, min(max_n, -(-len(jobs) // concurrency)))
+        groups.extend((prompt, jobs[i : i + size]) for i in range(0, len(jobs), size))
+    return sorted(groups, key=lambda group: group[1][0][0])
 
 
-def main() -> int:
+def generate_all(prompts: list[str], concurrency: int, completed: dict[int, dict] | None = None, **kwargs) -> list[dict]:
+    """Generate every prompt, up to `concurrency` requests in flight; results keep prompt order.
+
+    API requests and saves (URL downloads, decode, disk writes) run as separate
+    stages, so the next request is already in flight while the last response is
+    written. At most 2 * `concurrency` responses are held between the stages.
+    Indices in `completed` (e.g. from a manifest) are not regenerated.
+    """
+    completed = completed or {}
+    groups = group_prompts(prompts, max_images_per_request(kwargs["model"]), concurrency, set(completed))
+    slots = threading.BoundedSemaphore(2 * concurrency)
+    requesters = ThreadPoolExecutor(max_workers=concurrency)
+    savers = ThreadPoolExecutor(max_workers=concurrency)
+
+    def release(saved: Future, finish: Callable[..., None]) -> None:
+        if saved.cancelled():
+            finish(discard=True)
+        slots.release()
+
+    def run(group: tuple[str, list[tuple[int, int]]]) -> tuple[list[dict], Future]:
+        prompt, jobs = group
+        # Wait for room before requesting, so a slow disk throttles the API stage.
+        slots.acquire()
+        finish = None
+        try:
+            group_items, finish = request_group(jobs, prompt, len(prompts), **kwargs)
+            saved = savers.submit(finish)
+        except BaseException:
+            # The save stage may already be shut down after another failure; drop this response.
+            if finish:
+                finish(discard=True)
+            slots.release()
+            raise
+        saved.add_done_callback(lambda future: release(future, finish))
+        return group_items, saved
+
+    items = dict(completed)
+    try:
+        for (_, jobs), requested in zip(groups, [requesters.submit(run, group) for group in groups]):
+            group_items, saved = requested.result()
+            saved.result()
+            items.update((idx, item) for (idx, _), item in zip(jobs, group_items))
+    finally:
+        # On failure, drop queued prompts instead of finishing the whole batch first.
+        requesters.shutdown(wait=False, cancel_futures=True)
+        savers.shutdown(cancel_futures=True)
+        requesters.shutdown()
+    return [items[idx] for idx in sorted(items)]
+
+
+def main(argv: list[str] | None = None) -> int:
     ap = argparse.ArgumentParser(description="Generate images via OpenAI Images API.")
     ap.add_argument("--prompt", help="Single prompt. If omitted, random prompts are generated.")
+    ap.add_argument("--prompts-file", help="File with one prompt per line ('-' for stdin); each is generated once.")
     ap.add_argument("--count", type=int, default=8, help="How many images to generate.")
     ap.add_argument("--model", default="gpt-image-1", help="Image model id.")
     ap.add_argument("--size", default="", help="Image size (e.g. 1024x1024, 1536x1024). Defaults based on model if not specified.")
@@ -172,67 +1068,123 @@ def main() -> int:
     ap.add_argument("--output-format", default="", help="Output format (GPT models only): png, jpeg, or webp.")
     ap.add_argument("--style", default="", help="Image style (dall-e-3 only): vivid or natural.")
     ap.add_argument("--out-dir", default="", help="Output directory (default: ./tmp/openai-image-gen-<ts>).")
-    args = ap.parse_args()
+    ap.add_argument("--resume", metavar="OUT_DIR", default="", help="Finish an interrupted run in OUT_DIR, skipping images in its manifest.")
+    ap.add_argument("--base-url", default=os.environ.get("OPENAI_BASE_URL", ""), help=f"API base URL (default: $OPENAI_BASE_URL or {DEFAULT_BASE_URL}).")
+    ap.add_argument("--concurrency", type=int, default=1, help="Max API requests in flight (default: 1).")
+    ap.add_argument("--rpm", type=float, default=0, help="Pace requests per model to N per minute (default: unpaced).")
+    ap.add_argument("--max-retries", type=int, default=5, help="Retries for 429/5xx/network errors (default: 5).")
+    ap.add_argument("--page-size", type=int, default=GALLERY_PAGE_SIZE, help=f"Images per gallery page (default: {GALLERY_PAGE_SIZE}).")
+    ap.add_argument("--no-thumbnails", action="store_true", help="Show full images in the gallery instead of WebP thumbnails.")
+    ap.add_argument("--cache", action="store_true", help="Reuse images from earlier runs with identical request args.")
+    ap.add_argument("--cache-dir", default="", help="Cache directory (default: $XDG_CACHE_HOME/openai-image-gen).")
+    ap.add_argument("--cache-max-mb", type=float, default=2048, help="Evict least recently used images past this size (default: 2048).")
+    args = ap.parse_args(argv)
+    if args.concurrency < 1:
+        ap.error("--concurrency must be >= 1")
+    if args.rpm < 0 or args.max_retries < 0:
+        ap.error("--rpm and --max-retries must be >= 0")
+    if args.cache_max_mb < 0:
+        ap.error("--cache-max-mb must be >= 0")
+    if args.page_size < 1:
+        ap.error("--page-size must be >= 1")
+    if args.prompt and args.prompts_file:
+        ap.error("--prompt and --prompts-file are mutually exclusive")
+    if args.resume and (args.out_dir or args.prompt or args.prompts_file):
+        ap.error("--resume reuses the run's prompts and output directory")
 
     api_key = (os.environ.get("OPENAI_API_KEY") or "").strip()
     if not api_key:
         print("Missing OPENAI_API_KEY", file=sys.stderr)
         return 2
 
-    # Apply model-specific defaults if not specified
-    default_size, default_quality = get_model_defaults(args.model)
-    size = args.size or default_size
-    quality = args.quality or default_quality
-
-    count = args.count
-    if args.model == "dall-e-3" and count > 1:
-        print(f"Warning: dall-e-3 only supports generating 1 image at a time. Reducing count from {count} to 1.", file=sys.stderr)
-        count = 1
+    if args.resume:
+        out_dir = Path(args.resume).expanduser()
+        try:
+            run = json.loads((out_dir / RUN_NAME).read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"Cannot resume {out_dir}: {e}", file=sys.stderr)
+            return 2
+        completed = load_manifest(out_dir)
+        print(f"Resuming {out_dir}: {len(completed)}/{len(run['prompts'])} images done.", flush=True)
+    else:
+        # Apply model-specific defaults if not specified
+        default_size, default_quality = get_model_defaults(args.model)
 
-    out_dir = Path(args.out_dir).expanduser() if args.out_dir else default_out_dir()
-    out_dir.mkdir(parents=True, exist_ok=True)
+        count = args.count
+        if args.model == "dall-e-3" and count > 1:
+            print(f"Warning: dall-e-3 only supports generating 1 image at a time. Reducing count from {count} to 1.", file=sys.stderr)
+            count = 1
 
-    prompts = [args.prompt] * count if args.prompt else pick_prompts(count)
+        out_dir = Path(args.out_dir).expanduser() if args.out_dir else default_out_dir()
+        out_dir.mkdir(parents=True, exist_ok=True)
 
-    # Determine file extension based on output format
-    if args.model.startswith("gpt-image") and args.output_format:
-        file_ext = args.output_format
-    else:
-        file_ext = "png"
+        if args.prompts_file:
+            prompts = read_prompts_file(args.prompts_file)
+        else:
+            prompts = [args.prompt] * count if args.prompt else pick_prompts(count)
+        if not prompts:
+            print("No prompts to generate.", file=sys.stderr)
+            return 2
 
-    items: list[dict] = []
-    for idx, prompt in enumerate(prompts, start=1):
-        print(f"[{idx}/{len(prompts)}] {prompt}")
-        res = request_images(
-            api_key,
-            prompt,
-            args.model,
-            size,
-            quality,
-            args.background,
-            args.output_format,
-            args.style,
-        )
-        data = res.get("data", [{}])[0]
-        image_b64 = data.get("b64_json")
-        image_url = data.get("url")
-        if not image_b64 and not image_url:
-            raise RuntimeError(f"Unexpected response: {json.dumps(res)[:400]}")
-
-        filename = f"{idx:03d}-{slugify(prompt)[:40]}.{file_ext}"
-        filepath = out_dir / filename
-        if image_b64:
-            filepath.write_bytes(base64.b64decode(image_b64))
+        # Determine file extension based on output format
+        if args.model.startswith("gpt-image") and args.output_format:
+            file_ext = args.output_format
         else:
-            try:
-                urllib.request.urlretrieve(image_url, filepath)
-            except urllib.error.URLError as e:
-                raise RuntimeError(f"Failed to download image from {image_url}: {e}") from e
+            file_ext = "png"
+
+        # Everything --resume needs to finish the run with identical requests.
+        run = {
+            "model": args.model,
+            "size": args.size or default_size,
+            "quality": args.quality or default_quality,
+            "background": args.background,
+            "output_format": args.output_format,
+            "style": args.style,
+            "file_ext": file_ext,
+            "prompts": prompts,
+        }
+        (out_dir / RUN_NAME).write_text(json.dumps(run, indent=2), encoding="utf-8")
+        (out_dir / MANIFEST_NAME).unlink(missing_ok=True)
+        completed = {}
 
-        items.append({"prompt": prompt, "file": filename})
+    cache = None
+    if args.cache:
+        cache_dir = Path(args.cache_dir).expanduser() if args.cache_dir else default_cache_dir()
+        cache = ImageCache(cache_dir, int(args.cache_max_mb * 1024 * 1024))
+    pool = HTTPPool()
+    manifest = Manifest(out_dir)
+    gallery = Gallery(out_dir, len(run["prompts"]), args.page_size, thumbnails=not args.no_thumbnails)
+    for idx, item in completed.items():
+        gallery.add(idx, item, write=False)
+    gallery.write_all()
+    try:
+        items = generate_all(
+            run["prompts"],
+            args.concurrency,
+            completed,
+            out_dir=out_dir,
+            file_ext=run["file_ext"],
+            api_key=api_key,
+            model=run["model"],
+            size=run["size"],
+            quality=run["quality"],
+            background=run["background"],
+            output_format=run["output_format"],
+            style=run["style"],
+            scheduler=RequestScheduler(args.rpm, args.max_retries),
+            pool=pool,
+            cache=cache,
+            manifest=manifest,
+            gallery=gallery,
+            base_url=args.base_url,
+        )
+    finally:
+        pool.close()
+        manifest.close()
+        if cache:
+            cache.close()
 
     (out_dir / "prompts.json").write_text(json.dumps(items, indent=2), encoding="utf-8")
-    write_gallery(out_dir, items)
     print(f"\nWrote: {(out_dir / 'index.html').as_posix()}")
     return 0
 
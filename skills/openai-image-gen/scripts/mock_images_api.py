@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Offline stand-in for the OpenAI /v1/images/generations endpoint.
+
+Serves real (noise) PNGs as b64_json or as URLs on the same server, with
+configurable latency and injected 429s, so gen.py can be tested and
+benchmarked without the network:
+
+    python3 mock_images_api.py --port 8787 --latency 0.5 --rate-limit 0.05
+    OPENAI_API_KEY=x python3 gen.py --base-url http://127.0.0.1:8787/v1 --count 16
+"""
+
+import argparse
+import base64
+import json
+import random
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MODES = ("b64", "url")
+
+
+def noise_png(side: int, seed: int = 0) -> bytes:
+    """Build a side x side RGB PNG of random noise (incompressible, like real photos)."""
+    rng = random.Random(seed)
+    row_bytes = side * 3
+    raw = b"".join(b"\x00" + rng.randbytes(row_bytes) for _ in range(side))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", side, side, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw, 1)) + chunk(b"IEND", b"")
+
+
+class MockImagesAPI:
+    """Threaded mock server; `start()` returns the base URL to pass as --base-url."""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        rate_limit: float = 0.0,
+        mode: str = "b64",
+        image_side: int = 256,
+        retry_after_ms: int = 50,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        seed: int = 0,
+    ) -> None:
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.mode = mode
+        self.retry_after_ms = retry_after_ms
+        self.image = noise_png(image_side, seed)
+        self.image_b64 = base64.b64encode(self.image).decode("ascii")
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.images = 0
+        self.rate_limited = 0
+        self.server = ThreadingHTTPServer((host, port), self.handler())
+        self.server.daemon_threads = True
+        self.thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> str:
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "MockImagesAPI":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def delay(self) -> float:
+        with self.lock:
+            spread = self.rng.uniform(-self.jitter, self.jitter) if self.jitter else 0.0
+        return max(0.0, self.latency + spread)
+
+    def should_rate_limit(self) -> bool:
+        with self.lock:
+            self.requests += 1
+            limited = self.rng.random() < self.rate_limit
+            if limited:
+                self.rate_limited += 1
+            return limited
+
+    def generations(self, payload: dict) -> dict:
+        n = int(payload.get("n") or 1)
+        with self.lock:
+            self.images += n
+        if self.mode == "b64":
+            data = [{"b64_json": self.image_b64} for _ in range(n)]
+        else:
+            host, port = self.server.server_address[:2]
+            data = [{"url": f"http://{host}:{port}/images/{i}.png"} for i in range(n)]
+        return {"created": int(time.time()), "data": data}
+
+    def handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status: int, body: bytes, content_type: str, headers: dict | None = None) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length)
+                if self.path.rstrip("/") != "/v1/images/generations":
+                    self.reply(404, b'{"error": {"message": "not found"}}', "application/json")
+                    return
+                if not self.headers.get("Authorization", "").startswith("Bearer "):
+                    self.reply(401, b'{"error": {"message": "missing api key"}}', "application/json")
+                    return
+                time.sleep(api.delay())
+                if api.should_rate_limit():
+                    body = b'{"error": {"message": "Rate limit reached", "type": "requests"}}'
+                    self.reply(429, body, "application/json", {"retry-after-ms": str(api.retry_after_ms)})
+                    return
+                try:
+                    payload = json.loads(raw.decode("utf-8"))
+                except ValueError:
+                    self.reply(400, b'{"error": {"message": "invalid json"}}', "application/json")
+                    return
+                self.reply(200, json.dumps(api.generations(payload)).encode("utf-8"), "application/json")
+
+            def do_GET(self):
+                if self.path.startswith("/images/"):
+                    self.reply(200, api.image, "image/png")
+                else:
+                    self.reply(404, b"not found", "text/plain")
+
+        return Handler
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Serve a mock OpenAI Images API for offline testing.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8787)
+    ap.add_argument("--latency", type=float, default=0.0, help="Seconds before each response (default: 0).")
+    ap.add_argument("--jitter", type=float, default=0.0, help="Uniform +/- seconds added to --latency.")
+    ap.add_argument("--rate-limit", type=float, default=0.0, help="Fraction of requests answered with 429 (0-1).")
+    ap.add_argument("--retry-after-ms", type=int, default=50, help="retry-after-ms sent with injected 429s.")
+    ap.add_argument("--mode", choices=MODES, default="b64", help="Return b64_json images or URLs to fetch.")
+    ap.add_argument("--image-side", type=int, default=256, help="Width/height of the served PNG (default: 256).")
+    args = ap.parse_args()
+    if not 0 <= args.rate_limit <= 1:
+        ap.error("--rate-limit must be between 0 and 1")
+
+    api = MockImagesAPI(
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_limit=args.rate_limit,
+        mode=args.mode,
+        image_side=args.image_side,
+        retry_after_ms=args.retry_after_ms,
+        host=args.host,
+        port=args.port,
+    )
+    print(f"Mock Images API at {api.base_url} ({args.mode}, {len(api.image):,} byte PNG)", flush=True)
+    try:
+        api.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
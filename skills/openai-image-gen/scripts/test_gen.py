@@ -1,9 +1,34 @@
-"""Tests for write_gallery HTML escaping (fixes #12538 - stored XSS)."""
+"""Tests for gen.py: gallery HTML escaping (fixes #12538 - stored XSS) and batch helpers."""
 
+import base64
+import errno
+import http.client
+import io
+import json
+import ssl
 import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
-from gen import write_gallery
+import gen
+import pytest
+from gen import (
+    HTTPPool,
+    ImageCache,
+    ImagesAPIError,
+    Manifest,
+    RequestScheduler,
+    generate_all,
+    load_manifest,
+    parse_retry_after,
+    read_images_response,
+    request_images,
+    save_image,
+    write_gallery,
+)
+from mock_images_api import MockImagesAPI
 
 
 def test_write_gallery_escapes_prompt_xss():
@@ -48,3 +73,384 @@ def test_write_gallery_normal_output():
         assert 'src="001-lobster.png"' in html
         assert "002-nook.png" in html
 
+
+
+def test_generate_all_concurrent_keeps_prompt_order(monkeypatch):
+    in_flight = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def fake_request_images(api_key, prompt, *args, **kwargs):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        # Later prompts finish first.
+        time.sleep(0.05 / int(prompt.split()[-1]))
+        with lock:
+            in_flight -= 1
+        return {"data": [{"b64_json": base64.b64encode(prompt.encode()).decode()}]}
+
+    monkeypatch.setattr(gen, "request_images", fake_request_images)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        out = Path(tmpdir)
+        prompts = [f"prompt {i}" for i in range(1, 7)]
+        items = generate_all(
+            prompts, 3, out_dir=out, file_ext="png", api_key="k", model="gpt-image-1",
+            size="1024x1024", quality="high",
+        )
+        assert [it["prompt"] for it in items] == prompts
+        assert [it["file"] for it in items] == [f"{i:03d}-prompt-{i}.png" for i in range(1, 7)]
+        assert (out / "004-prompt-4.png").read_bytes() == b"prompt 4"
+    assert 1 < peak <= 3
+
+
+def test_scheduler_retries_rate_limits_then_succeeds():
+    calls = []
+
+    def flaky():
+        calls.append(time.monotonic())
+        if len(calls) < 3:
+            raise ImagesAPIError("slow down", status=429, retry_after=0.02, retryable=True)
+        return {"data": []}
+
+    scheduler = RequestScheduler(max_retries=3, base_delay=0.001)
+    assert scheduler.call("gpt-image-1", flaky) == {"data": []}
+    assert len(calls) == 3
+    assert calls[1] - calls[0] >= 0.02
+
+
+def test_scheduler_does_not_retry_fatal_errors():
+    calls = []
+
+    def bad_request():
+        calls.append(1)
+        raise ImagesAPIError("bad", status=400)
+
+    with pytest.raises(ImagesAPIError):
+        RequestScheduler(max_retries=3).call("gpt-image-1", bad_request)
+    assert calls == [1]
+
+
+def test_request_images_only_retries_transient_network_errors():
+    class FailingPool:
+        def __init__(self, error):
+            self.error = error
+
+        def open(self, *args, **kwargs):
+            raise self.error
+
+    for error in [
+        ConnectionResetError("reset"),
+        TimeoutError("timed out"),
+        http.client.RemoteDisconnected("closed"),
+        http.client.IncompleteRead(b"partial"),
+    ]:
+        with pytest.raises(ImagesAPIError) as exc:
+            request_images("k", "p", "gpt-image-1", "1024x1024", "high", pool=FailingPool(error))
+        assert exc.value.retryable
+
+    for error in [
+        OSError(errno.ENOSPC, "No space left on device"),
+        ssl.SSLCertVerificationError("certificate verify failed"),
+    ]:
+        with pytest.raises(type(error)):
+            request_images("k", "p", "gpt-image-1", "1024x1024", "high", pool=FailingPool(error))
+
+
+def test_parse_retry_after_headers():
+    assert parse_retry_after({"retry-after": "2"}) == 2.0
+    assert parse_retry_after({"retry-after-ms": "250"}) == 0.25
+    assert parse_retry_after({"x-ratelimit-reset-requests": "1m30s"}) == 90.0
+    assert parse_retry_after({}) is None
+
+
+def test_http_pool_reuses_one_connection_across_downloads():
+    clients = set()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            clients.add(self.client_address)
+            if self.path == "/redirect":
+                self.send_response(302)
+                self.send_header("Location", "/image.png")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = b"\x89PNG" + b"0" * 4096
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args, **kwargs):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    pool = HTTPPool(timeout=5)
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for idx in range(4):
+                url = f"http://127.0.0.1:{server.server_port}/redirect"
+                save_image({"data": [{"url": url}]}, Path(tmpdir) / f"{idx}.png", pool)
+            assert (Path(tmpdir) / "3.png").read_bytes().startswith(b"\x89PNG")
+    finally:
+        pool.close()
+        server.shutdown()
+        server.server_close()
+    assert len(clients) == 1
+
+
+def test_read_images_response_spools_b64_to_disk(monkeypatch):
+    monkeypatch.setattr(gen, "STREAM_CHUNK_SIZE", 7)
+    image = bytes(range(256)) * 5
+    encoded = base64.encodebytes(image).decode("ascii")  # embedded newlines, like wrapped base64
+    body = json.dumps(
+        {
+            "created": 1,
+            "data": [{"revised_prompt": 'say "b64_json"', "b64_json": encoded}],
+        }
+    )
+    body = body.replace("/", "\\/").encode("utf-8")  # JSON encoders may escape slashes
+    with tempfile.TemporaryDirectory() as tmpdir:
+        out = Path(tmpdir)
+        res = read_images_response(io.BytesIO(body), out)
+        item = res["data"][0]
+        assert "b64_json" not in item
+        assert item["revised_prompt"] == 'say "b64_json"'
+        assert Path(item["b64_file"]).read_bytes() == image
+
+        save_image(res, out / "001-test.png")
+        assert (out / "001-test.png").read_bytes() == image
+        assert [p.name for p in out.iterdir()] == ["001-test.png"]
+
+
+def test_read_images_response_skips_null_b64_json():
+    image = b"\x89PNG second image"
+    body = json.dumps({
+        "data": [
+            {"url": "https://example.test/1.png", "b64_json": None},
+            {"url": None, "b64_json": base64.b64encode(image).decode()},
+        ]
+    }).encode("utf-8")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        res = read_images_response(io.BytesIO(body), Path(tmpdir))
+        first, second = res["data"]
+        assert first == {"url": "https://example.test/1.png", "b64_json": None}
+        assert Path(second["b64_file"]).read_bytes() == image
+
+
+def test_read_images_response_cleans_up_truncated_body():
+    body = b'{"data": [{"b64_json": "' + base64.b64encode(b"x" * 300)[:100]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with pytest.raises(ValueError):
+            read_images_response(io.BytesIO(body), Path(tmpdir))
+        assert list(Path(tmpdir).iterdir()) == []
+
+
+def test_image_cache_reuses_results_and_evicts_lru(monkeypatch):
+    calls = []
+
+    def fake_request_images(api_key, prompt, *args, **kwargs):
+        calls.append(prompt)
+        payloads = [f"{prompt} #{len(calls)}.{i}".encode() * 40 for i in range(args[-1])]
+        return {"data": [{"b64_json": base64.b64encode(payload).decode()} for payload in payloads]}
+
+    monkeypatch.setattr(gen, "request_images", fake_request_images)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        cache = ImageCache(root / "cache", max_bytes=1 << 20)
+        opts = dict(file_ext="png", api_key="k", model="gpt-image-1", size="1024x1024", quality="high", cache=cache)
+        first = root / "first"
+        first.mkdir()
+        generate_all(["cat", "cat", "dog"], 1, out_dir=first, **opts)
+        assert calls == ["cat", "dog"]
+
+        second = root / "second"
+        second.mkdir()
+        generate_all(["cat", "cat", "dog", "dog"], 1, out_dir=second, **opts)
+        # Only the new second "dog" variant is requested; hits are hardlinked.
+        assert calls == ["cat", "dog", "dog"]
+        assert (second / "002-cat.png").read_bytes() == (first / "002-cat.png").read_bytes()
+        assert (second / "001-cat.png").read_bytes() != (second / "002-cat.png").read_bytes()
+        assert (second / "001-cat.png").stat().st_ino == (first / "001-cat.png").stat().st_ino
+
+        cache.max_bytes = (second / "004-dog.png").stat().st_size
+        cache.store(ImageCache.key({"prompt": "fresh"}), second / "004-dog.png")
+        objects = [p for p in (root / "cache" / "objects").rglob("*") if p.is_file()]
+        assert len(objects) == 1
+        cat_args = gen.build_request_args("cat", "gpt-image-1", "1024x1024", "high")
+        cat_key = ImageCache.key(cat_args, 0)
+        assert not cache.fetch(cat_key, root / "miss.png")
+        # The endpoint is part of the key: a mock or proxy never serves real-API hits.
+        assert cat_key == ImageCache.key(cat_args, 0, gen.DEFAULT_BASE_URL + "/")
+        assert cat_key != ImageCache.key(cat_args, 0, "http://127.0.0.1:8787/v1")
+        cache.close()
+
+
+def test_generate_all_batches_identical_prompts_up_to_model_limit(monkeypatch):
+    requests = []
+
+    def fake_request_images(api_key, prompt, model, *args, **kwargs):
+        n = args[-1]
+        requests.append((prompt, n))
+        return {"data": [{"b64_json": base64.b64encode(f"{prompt} {i}".encode()).decode()} for i in range(n)]}
+
+    monkeypatch.setattr(gen, "request_images", fake_request_images)
+    monkeypatch.setitem(gen.MAX_IMAGES_PER_REQUEST, "gpt-image-1", 4)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        out = Path(tmpdir)
+        prompts = ["cat"] * 6 + ["dog", "cat"]
+        items = generate_all(
+            prompts, 1, out_dir=out, file_ext="png", api_key="k", model="gpt-image-1",
+            size="1024x1024", quality="high",
+        )
+        assert requests == [("cat", 4), ("cat", 3), ("dog", 1)]
+        assert [it["prompt"] for it in items] == prompts
+        assert (out / "004-cat.png").read_bytes() == b"cat 3"
+        assert (out / "008-cat.png").read_bytes() == b"cat 2"
+        assert sorted(p.name for p in out.iterdir()) == [it["file"] for it in items]
+
+    # Batches shrink so concurrent workers all get a request.
+    groups = gen.group_prompts(["cat"] * 8, 10, concurrency=4)
+    assert [len(jobs) for _, jobs in groups] == [2, 2, 2, 2]
+
+
+def test_manifest_lets_an_interrupted_run_resume(monkeypatch):
+    calls = []
+    failed = []
+
+    def fake_request_images(api_key, prompt, *args, **kwargs):
+        calls.append(prompt)
+        if prompt == "three" and not failed:
+            failed.append(prompt)
+            raise ImagesAPIError("boom")
+        return {"data": [{"b64_json": base64.b64encode(prompt.encode()).decode()}]}
+
+    monkeypatch.setattr(gen, "request_images", fake_request_images)
+    prompts = ["one", "two", "three", "four"]
+    opts = dict(file_ext="png", api_key="k", model="gpt-image-1", size="1024x1024", quality="high")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        out = Path(tmpdir)
+        manifest = Manifest(out)
+        with pytest.raises(ImagesAPIError):
+            generate_all(prompts, 1, out_dir=out, manifest=manifest, **opts)
+        manifest.close()
+        with (out / "manifest.jsonl").open("a") as handle:
+            handle.write('{"idx": 3, "pro')  # torn final line from a crash
+
+        done = load_manifest(out)
+        assert done[1] == {"prompt": "one", "file": "001-one.png"}
+        assert done[2] == {"prompt": "two", "file": "002-two.png"}
+        assert 3 not in done
+        # "four" may already have been in flight when "three" failed.
+        pending = [p for i, p in enumerate(prompts, start=1) if i not in done]
+
+        calls.clear()
+        manifest = Manifest(out)
+        items = generate_all(prompts, 1, done, out_dir=out, manifest=manifest, **opts)
+        manifest.close()
+        assert calls == pending
+        assert [it["file"] for it in items] == ["001-one.png", "002-two.png", "003-three.png", "004-four.png"]
+        assert sorted(load_manifest(out)) == [1, 2, 3, 4]
+
+
+def test_generate_all_overlaps_requests_with_saves(monkeypatch):
+    saving = threading.Event()
+    overlapped = []
+    real_save_image = gen.save_image
+
+    def fake_request_images(api_key, prompt, *args, **kwargs):
+        overlapped.append(saving.is_set())
+        return {"data": [{"b64_json": base64.b64encode(prompt.encode()).decode()}]}
+
+    def slow_save_image(*args, **kwargs):
+        saving.set()
+        time.sleep(0.05)
+        real_save_image(*args, **kwargs)
+        saving.clear()
+
+    monkeypatch.setattr(gen, "request_images", fake_request_images)
+    monkeypatch.setattr(gen, "save_image", slow_save_image)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        out = Path(tmpdir)
+        prompts = [f"prompt {i}" for i in range(1, 5)]
+        items = generate_all(
+            prompts, 1, out_dir=out, file_ext="png", api_key="k", model="gpt-image-1",
+            size="1024x1024", quality="high",
+        )
+        assert [(out / it["file"]).read_bytes() for it in items] == [p.encode() for p in prompts]
+    # With one request in flight, later requests still run while earlier images are written.
+    assert any(overlapped[1:])
+
+
+def test_gallery_paginates_and_updates_pages_as_images_land():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        out = Path(tmpdir)
+        gallery = gen.Gallery(out, total=5, page_size=2, thumbnails=False)
+        gallery.write_all()
+        assert sorted(p.name for p in out.glob("*.html")) == ["index.html", "page-2.html", "page-3.html"]
+        assert "<figure>" not in (out / "page-2.html").read_text()
+
+        gallery.add(4, {"prompt": "four", "file": "004-four.png"})
+        page = (out / "page-2.html").read_text()
+        assert 'src="004-four.png"' in page
+        assert '<a href="index.html">1</a>' in page and "<strong>2</strong>" in page
+        assert "<figure>" not in (out / "index.html").read_text()
+
+
+def test_gallery_links_thumbnails_when_pillow_is_available():
+    image_module = pytest.importorskip("PIL.Image")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        out = Path(tmpdir)
+        image_module.new("RGBA", (1536, 1024), (200, 10, 10, 128)).save(out / "001-big.png")
+        write_gallery(out, [{"prompt": "big", "file": "001-big.png"}])
+        html = (out / "index.html").read_text()
+        assert 'src="thumbs/001-big.webp"' in html
+        assert 'href="001-big.png"' in html
+        with image_module.open(out / "thumbs" / "001-big.webp") as thumb:
+            assert max(thumb.size) == gen.THUMB_SIZE
+
+
+@pytest.mark.parametrize("mode", ["b64", "url"])
+def test_main_against_mock_images_api(monkeypatch, capsys, mode):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    with MockImagesAPI(mode=mode, rate_limit=0.3, retry_after_ms=1, image_side=64, seed=1) as api:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            out = Path(tmpdir)
+            code = gen.main([
+                "--prompt", "mock", "--count", "5", "--out-dir", str(out), "--base-url", api.base_url,
+                "--concurrency", "2", "--max-retries", "20", "--no-thumbnails",
+            ])
+            assert code == 0
+            files = sorted(out.glob("*.png"))
+            assert len(files) == 5
+            assert all(f.read_bytes() == api.image for f in files)
+            assert not list(out.glob(".*.part"))
+            assert len(gen.load_manifest(out)) == 5
+        assert api.images == 5
+        assert api.rate_limited  # seed 1 injects 429s
+        # Identical prompts batch into n>1 requests, plus one per injected 429.
+        assert api.requests == 2 + api.rate_limited
+
+
+def test_failed_save_leaves_no_spooled_files(monkeypatch):
+    with MockImagesAPI(latency=0.02, image_side=16) as api:
+        def failing_save_image(res, filepath, *args, **kwargs):
+            if filepath.name.startswith("002-"):
+                raise RuntimeError("disk full")
+            real_save_image(res, filepath, *args, **kwargs)
+
+        real_save_image = gen.save_image
+        monkeypatch.setattr(gen, "save_image", failing_save_image)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            out = Path(tmpdir)
+            with pytest.raises(RuntimeError, match="disk full"):
+                generate_all(
+                    [f"prompt {i}" for i in range(1, 13)], 4, out_dir=out, file_ext="png", api_key="k",
+                    model="gpt-image-1", size="1024x1024", quality="high", base_url=api.base_url,
+                )
+            assert list(out.glob(".*.part")) == []